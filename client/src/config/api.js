@@ -3,6 +3,9 @@ import axios from 'axios';
 // Create a new axios instance
 const apiClient = axios.create({
   baseURL: import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000',
+  // Send cookies cross-origin: after a write the API sets one that keeps this
+  // user's reads on the primary database for a few seconds
+  withCredentials: true,
 });
 
 // Add a request interceptor to include the token in headers
@@ -0,0 +1,78 @@
+import apiClient from './api';
+
+// Live account events from GET /events/stream (Server-Sent Events).
+// EventSource can't send an Authorization header, so the stream is read with
+// fetch instead. The connection is re-opened whenever it ends; the server
+// closes streams periodically and sends `ready` again on every connect.
+// - 401/403 stop the subscription: retrying with the same token can't succeed.
+// - Failed connects (e.g. 503 when the server is at its stream limit) back off
+//   exponentially, honouring Retry-After; a successful connect resets the delay.
+
+const RECONNECT_DELAY_MS = 1000;
+const MAX_RECONNECT_DELAY_MS = 30000;
+
+const retryAfterMs = (response) => {
+    const seconds = Number(response.headers.get('Retry-After'));
+    return Number.isFinite(seconds) && seconds > 0 ? seconds * 1000 : 0;
+};
+
+const parseEvent = (block) => {
+    let name = 'message';
+    const data = [];
+    for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) {
+            name = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            data.push(line.slice(5).trim());
+        }
+    }
+    return data.length ? { name, data: JSON.parse(data.join('\n')) } : null;
+};
+
+// Calls onEvent(name, data) for every event until the returned function is called.
+export const subscribeToAccountEvents = (onEvent) => {
+    const controller = new AbortController();
+
+    const connect = async () => {
+        let delay = RECONNECT_DELAY_MS;
+        while (!controller.signal.aborted) {
+            let wait = delay;
+            try {
+                const token = localStorage.getItem('token');
+                const response = await fetch(`${apiClient.defaults.baseURL}/events/stream`, {
+                    headers: token ? { Authorization: `Bearer ${token}` } : {},
+                    signal: controller.signal,
+                });
+                if (response.status === 401 || response.status === 403) {
+                    console.error('Account event stream not authorized; not reconnecting');
+                    return;
+                }
+                if (!response.ok) {
+                    wait = Math.max(delay, retryAfterMs(response));
+                    delay = Math.min(delay * 2, MAX_RECONNECT_DELAY_MS);
+                } else {
+                    delay = wait = RECONNECT_DELAY_MS;
+                    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+                    let buffer = '';
+                    for (;;) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+                        buffer += value;
+                        const blocks = buffer.split('\n\n');
+                        buffer = blocks.pop();
+                        blocks.map(parseEvent).filter(Boolean).forEach(event => onEvent(event.name, event.data));
+                    }
+                }
+            } catch (error) {
+                if (controller.signal.aborted) return;
+                console.error('Account event stream failed', error);
+                delay = Math.min(delay * 2, MAX_RECONNECT_DELAY_MS);
+            }
+            // Jitter, so clients dropped together don't all reconnect together
+            await new Promise(resolve => setTimeout(resolve, wait * (1 + Math.random() / 2)));
+        }
+    };
+
+    connect();
+    return () => controller.abort();
+};
@@ -68,9 +68,13 @@ export const AuthProvider = ({ children }) => {
     };
 
     const logout = () => {
-        // Even with JWT, calling logout can be useful for server-side logging
-        apiClient.post('/auth/logout').catch(err => console.error("Logout API call failed", err));
-        
+        // The server revokes the token, so send it explicitly: the request
+        // interceptor runs after the token is removed from storage below.
+        const token = localStorage.getItem('token');
+        apiClient.post('/auth/logout', null, {
+            headers: token ? { Authorization: `Bearer ${token}` } : {}
+        }).catch(err => console.error("Logout API call failed", err));
+
         localStorage.removeItem('token');
         setUser(null);
     };
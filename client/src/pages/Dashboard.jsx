@@ -1,11 +1,13 @@
 import { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
 import apiClient from '../config/api';
+import { subscribeToAccountEvents } from '../config/events';
 import { RefreshCw, TrendingUp, TrendingDown, ArrowRightLeft, CreditCard, DollarSign, Calendar } from 'lucide-react';
 import { motion } from 'framer-motion';
 
 const Dashboard = () => {
     const [transactions, setTransactions] = useState([]);
+    const [accounts, setAccounts] = useState(null);
     const [isLoading, setIsLoading] = useState(false);
     const { user } = useAuth(); // The user object now contains accounts
 
@@ -16,17 +18,13 @@ const Dashboard = () => {
 
         setIsLoading(true);
         try {
-            // Create an array of promises for all transaction fetch calls
-            const transactionPromises = user.accounts.map(account =>
-                apiClient.get(`/transactions/${account.account_id}`)
-            );
+            // One request returns every account with its recent transactions
+            const response = await apiClient.get('/dashboard');
+            setAccounts(response.data.accounts);
 
-            // Wait for all promises to resolve
-            const responses = await Promise.all(transactionPromises);
-
-            // Flatten the array of arrays of transactions and sort by date
-            const allTransactions = responses
-                .flatMap(res => res.data)
+            // Flatten the per-account transactions and sort by date
+            const allTransactions = response.data.accounts
+                .flatMap(account => account.recent_transactions)
                 .sort((a, b) => new Date(b.transaction_date) - new Date(a.transaction_date));
 
             setTransactions(allTransactions);
@@ -38,11 +36,38 @@ const Dashboard = () => {
         }
     };
 
-    // Fetch transactions when the component mounts or when user accounts change
+    const handleAccountEvent = (name, data) => {
+        if (name === 'ready' || name === 'resync') {
+            // (Re)connected or events were dropped: load the current state
+            fetchTransactions();
+        } else if (name === 'balance') {
+            // Balances can arrive out of order; keep the highest version
+            setAccounts(current => current && current.map(account =>
+                account.account_id === data.account_id && data.version > account.version
+                    ? { ...account, balance: data.balance, version: data.version }
+                    : account
+            ));
+        } else if (name === 'transaction') {
+            setTransactions(current => [{ ...data, transaction_id: `event-${data.event_id}` }, ...current]);
+        }
+    };
+
+    // Load the dashboard when the component mounts or when user accounts change,
+    // whether or not the live stream connects.
     useEffect(() => {
         fetchTransactions();
     }, [user]);
 
+    // Subscribe to live updates. Every (re)connect announces itself with `ready`
+    // and loads the dashboard again, so nothing changed while disconnected is
+    // missed; unchanged data comes back as a cheap 304 thanks to the ETag.
+    useEffect(() => {
+        if (!user?.accounts || user.accounts.length === 0) {
+            return;
+        }
+        return subscribeToAccountEvents(handleAccountEvent);
+    }, [user]);
+
     if (!user) {
         // This can be a loading spinner or null while auth context is loading
         return null;
@@ -74,7 +99,7 @@ const Dashboard = () => {
             </header>
 
             <motion.div variants={containerVariants} initial="hidden" animate="show" className="grid" style={{ display: 'grid', gridTemplateColumns: 'repeat(auto-fit, minmax(300px, 1fr))', gap: '1.5rem', marginBottom: '3rem' }}>
-                {user.accounts.map((acc, index) => (
+                {(accounts ?? user.accounts).map((acc, index) => (
                     <motion.div
                         key={acc.account_id}
                         variants={itemVariants}
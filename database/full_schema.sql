@@ -6,6 +6,10 @@ USE banking_system;
 
 -- Disable foreign key checks for dropping tables
 SET FOREIGN_KEY_CHECKS = 0;
+DROP TABLE IF EXISTS daily_balances;
+DROP TABLE IF EXISTS statement_periods;
+DROP TABLE IF EXISTS number_sequences;
+DROP TABLE IF EXISTS idempotency_keys;
 DROP TABLE IF EXISTS transactions;
 DROP TABLE IF EXISTS accounts;
 DROP TABLE IF EXISTS users;
@@ -42,7 +46,9 @@ CREATE TABLE accounts (
     account_number VARCHAR(20) NOT NULL UNIQUE,
     account_type VARCHAR(20) DEFAULT 'savings',
     balance DECIMAL(15, 2) DEFAULT 0.00,
+    version BIGINT NOT NULL DEFAULT 0, -- bumped on every balance change; used for ETags
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_accounts_customer_id (customer_id),
     FOREIGN KEY (customer_id) REFERENCES customers(customer_id) ON DELETE CASCADE
 );
 
@@ -54,6 +60,67 @@ CREATE TABLE transactions (
     amount DECIMAL(15, 2) NOT NULL,
     description TEXT,
     transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Serves the history query in both directions without a filesort: newest
+    -- first (date DESC, id DESC) scans it backwards, oldest first forwards
+    INDEX ix_transactions_account_date (account_id, transaction_date, transaction_id),
+    -- Month-end and backfill jobs read one date range across all accounts
+    INDEX ix_transactions_date (transaction_date),
+    FOREIGN KEY (account_id) REFERENCES accounts(account_id) ON DELETE CASCADE
+);
+
+-- 5. Idempotency Keys (stored outcomes of money-moving requests, see idempotency.py)
+CREATE TABLE idempotency_keys (
+    user_id INT NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status_code INT, -- NULL while the first request is still running
+    response_body TEXT,
+    created_at DATETIME NOT NULL,
+    claimed_at DATETIME NOT NULL, -- when the running request took the key; stale claims are taken over
+    executing BOOLEAN NOT NULL DEFAULT FALSE, -- set before the operation runs; such claims are never taken over
+    PRIMARY KEY (user_id, idempotency_key),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+-- 6. Number Sequences (account numbers are reserved in blocks, see account_numbers.py)
+CREATE TABLE number_sequences (
+    name VARCHAR(50) PRIMARY KEY,
+    next_value BIGINT NOT NULL
+);
+
+-- 15-digit bodies + a Luhn check digit; can't collide with legacy 12-digit numbers
+INSERT INTO number_sequences (name, next_value) VALUES ('account_number', 100000000000000);
+
+-- 7. Statement Periods (monthly statement summaries, see statements.py)
+-- One row per account and month with activity. The current month is kept up to
+-- date by the update_ledger_summaries trigger; finished months are rebuilt from
+-- the ledger and marked closed by the month-end job.
+CREATE TABLE statement_periods (
+    account_id INT NOT NULL,
+    period_start DATE NOT NULL, -- first day of the month
+    opening_balance DECIMAL(15, 2) NOT NULL,
+    closing_balance DECIMAL(15, 2) NOT NULL,
+    deposits DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+    withdrawals DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+    transfers_in DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+    transfers_out DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+    transaction_count INT NOT NULL DEFAULT 0,
+    closed BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (account_id, period_start),
+    FOREIGN KEY (account_id) REFERENCES accounts(account_id) ON DELETE CASCADE
+);
+
+-- 8. Daily Balances (per account and day with activity, see daily_balances.py)
+-- Today's rows are kept up to date by the update_ledger_summaries trigger;
+-- history is filled by the parallel backfill job.
+CREATE TABLE daily_balances (
+    account_id INT NOT NULL,
+    day DATE NOT NULL,
+    closing_balance DECIMAL(15, 2) NOT NULL,
+    credits DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+    debits DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+    transaction_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (account_id, day),
     FOREIGN KEY (account_id) REFERENCES accounts(account_id) ON DELETE CASCADE
 );
 
@@ -73,6 +140,54 @@ END;
 //
 DELIMITER ;
 
+-- Trigger to maintain today's daily balance and the current month's statement summary.
+-- Balances are updated before the ledger row is inserted, so accounts.balance
+-- is the balance right after this transaction.
+DELIMITER //
+CREATE TRIGGER update_ledger_summaries
+AFTER INSERT ON transactions
+FOR EACH ROW
+BEGIN
+    DECLARE v_balance DECIMAL(15, 2);
+    DECLARE v_credit DECIMAL(15, 2);
+    DECLARE v_debit DECIMAL(15, 2);
+
+    SELECT balance INTO v_balance FROM accounts WHERE account_id = NEW.account_id;
+    SET v_credit = IF(NEW.transaction_type IN ('deposit', 'transfer_in'), NEW.amount, 0);
+    SET v_debit = NEW.amount - v_credit;
+
+    INSERT INTO statement_periods (account_id, period_start, opening_balance, closing_balance,
+                                   deposits, withdrawals, transfers_in, transfers_out, transaction_count)
+    VALUES (
+        NEW.account_id,
+        DATE_SUB(DATE(NEW.transaction_date), INTERVAL DAYOFMONTH(NEW.transaction_date) - 1 DAY),
+        v_balance - v_credit + v_debit,
+        v_balance,
+        IF(NEW.transaction_type = 'deposit', NEW.amount, 0),
+        IF(NEW.transaction_type = 'withdrawal', NEW.amount, 0),
+        IF(NEW.transaction_type = 'transfer_in', NEW.amount, 0),
+        IF(NEW.transaction_type = 'transfer_out', NEW.amount, 0),
+        1
+    )
+    ON DUPLICATE KEY UPDATE
+        closing_balance = v_balance,
+        deposits = deposits + IF(NEW.transaction_type = 'deposit', NEW.amount, 0),
+        withdrawals = withdrawals + IF(NEW.transaction_type = 'withdrawal', NEW.amount, 0),
+        transfers_in = transfers_in + IF(NEW.transaction_type = 'transfer_in', NEW.amount, 0),
+        transfers_out = transfers_out + IF(NEW.transaction_type = 'transfer_out', NEW.amount, 0),
+        transaction_count = transaction_count + 1;
+
+    INSERT INTO daily_balances (account_id, day, closing_balance, credits, debits, transaction_count)
+    VALUES (NEW.account_id, DATE(NEW.transaction_date), v_balance, v_credit, v_debit, 1)
+    ON DUPLICATE KEY UPDATE
+        closing_balance = v_balance,
+        credits = credits + v_credit,
+        debits = debits + v_debit,
+        transaction_count = transaction_count + 1;
+END;
+//
+DELIMITER ;
+
 -- --- STORED PROCEDURES ---
 
 -- Deposit Procedure
@@ -92,7 +207,7 @@ BEGIN
 
     -- Update balance
     UPDATE accounts 
-    SET balance = balance + p_amount 
+    SET balance = balance + p_amount, version = version + 1
     WHERE account_id = p_account_id;
 
     -- Record transaction
@@ -127,7 +242,7 @@ BEGIN
 
     IF current_bal >= p_amount THEN
         UPDATE accounts 
-        SET balance = balance - p_amount 
+        SET balance = balance - p_amount, version = version + 1
         WHERE account_id = p_account_id;
 
         INSERT INTO transactions (account_id, transaction_type, amount, description)
@@ -153,6 +268,7 @@ CREATE PROCEDURE TransferFunds(
 )
 BEGIN
     DECLARE from_bal DECIMAL(15, 2);
+    DECLARE to_id INT;
 
     DECLARE EXIT HANDLER FOR SQLEXCEPTION
     BEGIN
@@ -163,12 +279,20 @@ BEGIN
 
     START TRANSACTION;
 
-    SELECT balance INTO from_bal FROM accounts WHERE account_id = p_from_account_id FOR UPDATE;
+    -- Lock both rows in ascending account_id order, whichever direction the
+    -- money moves, so concurrent A->B and B->A transfers cannot deadlock.
+    IF p_from_account_id < p_to_account_id THEN
+        SELECT balance INTO from_bal FROM accounts WHERE account_id = p_from_account_id FOR UPDATE;
+        SELECT account_id INTO to_id FROM accounts WHERE account_id = p_to_account_id FOR UPDATE;
+    ELSE
+        SELECT account_id INTO to_id FROM accounts WHERE account_id = p_to_account_id FOR UPDATE;
+        SELECT balance INTO from_bal FROM accounts WHERE account_id = p_from_account_id FOR UPDATE;
+    END IF;
 
     IF from_bal >= p_amount THEN
         -- Debit Sender
         UPDATE accounts 
-        SET balance = balance - p_amount 
+        SET balance = balance - p_amount, version = version + 1
         WHERE account_id = p_from_account_id;
 
         INSERT INTO transactions (account_id, transaction_type, amount, description)
@@ -176,7 +300,7 @@ BEGIN
 
         -- Credit Receiver
         UPDATE accounts 
-        SET balance = balance + p_amount 
+        SET balance = balance + p_amount, version = version + 1
         WHERE account_id = p_to_account_id;
 
         INSERT INTO transactions (account_id, transaction_type, amount, description)
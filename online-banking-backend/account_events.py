@@ -0,0 +1,148 @@
+import asyncio
+import itertools
+from datetime import datetime
+
+from sqlalchemy import event, select
+
+import database, metrics, models
+from config import settings
+
+# --- Account Events ---
+# In-process pub/sub behind GET /events/stream.
+#
+# `ledger` records a "transaction" event on the session for every balance
+# change (`record`). Once that session commits, the events are published to
+# the subscribers of the accounts involved, followed by a "balance" event per
+# account carrying the committed balance and version. A rollback discards them.
+#
+# Every subscriber has its own queue of at most EVENTS_QUEUE_SIZE events, so a
+# slow client can never hold up a writer or grow memory without bound. When its
+# queue is full the backlog is dropped and replaced by a single "resync" event,
+# telling the client to re-fetch its accounts instead.
+#
+# Events only reach clients connected to the process that made the change, so
+# with several workers a client misses changes made by the others until it
+# re-fetches.
+
+RESYNC = ("resync", {})
+
+_SESSION_KEY = "account_events.pending"
+
+# account_id -> subscriptions listening to it
+_subscribers = {}
+_subscription_count = 0
+_event_ids = itertools.count(1)
+_tasks = set()  # Keeps publishing tasks referenced until they finish
+
+class Subscription:
+    """One connected client: the accounts it listens to and its bounded queue."""
+
+    def __init__(self, account_ids):
+        self.account_ids = frozenset(account_ids)
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+
+    def offer(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            dropped = self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            metrics.increment("events.dropped", dropped + 1)
+            metrics.increment("events.resyncs")
+
+    async def next(self, timeout: float):
+        """The next (event, data) pair, or None if nothing arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+def at_capacity() -> bool:
+    """True once EVENTS_MAX_SUBSCRIBERS clients are connected to this process."""
+    return _subscription_count >= settings.EVENTS_MAX_SUBSCRIBERS
+
+def subscribe(account_ids) -> Subscription:
+    """Registers a listener for `account_ids`; pair with `unsubscribe`."""
+    global _subscription_count
+    subscription = Subscription(account_ids)
+    for account_id in subscription.account_ids:
+        _subscribers.setdefault(account_id, set()).add(subscription)
+    _subscription_count += 1
+    return subscription
+
+def unsubscribe(subscription: Subscription):
+    global _subscription_count
+    for account_id in subscription.account_ids:
+        listeners = _subscribers.get(account_id)
+        if listeners is not None:
+            listeners.discard(subscription)
+            if not listeners:
+                del _subscribers[account_id]
+    _subscription_count -= 1
+
+def subscriber_count() -> int:
+    return _subscription_count
+
+def publish(account_id: int, name: str, data: dict):
+    """Queues an event for every subscriber of the account."""
+    for subscription in _subscribers.get(account_id, ()):
+        subscription.offer((name, {**data, "event_id": next(_event_ids)}))
+        metrics.increment("events.published")
+
+# --- Publishing committed changes ---
+
+def record(db, account_id: int, transaction_type: str, amount: float, description: str):
+    """
+    Records a ledger entry made in this session, published when it commits.
+    - `transaction_date` is UTC in whole seconds, like the stored row's
+      CURRENT_TIMESTAMP, so it matches what GET /transactions returns later.
+    """
+    db.info.setdefault(_SESSION_KEY, []).append({
+        "account_id": account_id,
+        "transaction_type": transaction_type,
+        "amount": amount,
+        "description": description,
+        "transaction_date": datetime.utcnow().replace(microsecond=0).isoformat(),
+    })
+
+async def _publish_committed(entries: list):
+    account_ids = {entry["account_id"] for entry in entries}
+    try:
+        # Read back from the primary, which has the committed balances
+        async with database.AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.Account.account_id, models.Account.balance, models.Account.version)
+                .where(models.Account.account_id.in_(account_ids))
+            )
+            balances = result.all()
+    except Exception:
+        metrics.increment("events.publish_errors")
+        balances = []
+
+    for entry in entries:
+        publish(entry["account_id"], "transaction", entry)
+    for row in balances:
+        publish(row.account_id, "balance", {"account_id": row.account_id, "balance": float(row.balance), "version": row.version})
+
+@event.listens_for(database.RoutingSession, "after_commit")
+def _publish_pending(session):
+    entries = session.info.pop(_SESSION_KEY, None)
+    if not entries:
+        return
+    # Nothing to do (not even the balance read) unless someone is listening
+    entries = [entry for entry in entries if entry["account_id"] in _subscribers]
+    if not entries:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # Committed outside the event loop (scripts); there are no subscribers there
+    task = loop.create_task(_publish_committed(entries))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+@event.listens_for(database.RoutingSession, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_SESSION_KEY, None)
@@ -0,0 +1,112 @@
+import asyncio
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+import database, metrics, models
+from config import settings
+
+# --- Account Number Allocation ---
+# Numbers are 15 digits from the "account_number" row of number_sequences plus
+# a Luhn check digit, so 16 digits in total. Legacy numbers were 12 random
+# digits, so the two ranges can never collide.
+#
+# Each process reserves a block of ACCOUNT_NUMBER_BLOCK_SIZE values with one
+# UPDATE and then hands them out from memory. Blocks never overlap, so this is
+# safe across workers and nodes; values left in a block when a process exits
+# are simply skipped.
+
+SEQUENCE_NAME = "account_number"
+FIRST_VALUE = 10 ** 14  # Smallest 15-digit value
+
+def luhn_check_digit(digits: str) -> str:
+    """Check digit that makes `digits` + digit pass the Luhn check."""
+    total = 0
+    for position, char in enumerate(reversed(digits)):
+        value = int(char)
+        if position % 2 == 0:  # Doubled, since the check digit will be appended to the right
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+def is_valid(account_number: str) -> bool:
+    """True for a well-formed allocated number (16 digits, valid check digit)."""
+    return (
+        len(account_number) == 16
+        and account_number.isdigit()
+        and luhn_check_digit(account_number[:-1]) == account_number[-1]
+    )
+
+def format_number(value: int) -> str:
+    body = str(value)
+    return body + luhn_check_digit(body)
+
+async def _reserve_block(size: int) -> int:
+    """Reserves [start, start + size) in its own transaction and returns start."""
+    sequences = models.NumberSequence.__table__
+    async with database.AsyncSessionLocal() as db:
+        for _ in range(2):
+            # The UPDATE row-locks the sequence until commit, so reading it back
+            # in the same transaction sees only our increment.
+            result = await db.execute(
+                update(sequences)
+                .where(sequences.c.name == SEQUENCE_NAME)
+                .values(next_value=sequences.c.next_value + size)
+            )
+            if result.rowcount == 1:
+                end = (await db.execute(
+                    select(sequences.c.next_value).where(sequences.c.name == SEQUENCE_NAME)
+                )).scalar_one()
+                await db.commit()
+                metrics.increment("account_numbers.blocks_reserved")
+                return end - size
+
+            # First use on this database: create the sequence row. If another
+            # process wins the race, its row is used on the second pass.
+            try:
+                await db.execute(insert(sequences).values(name=SEQUENCE_NAME, next_value=FIRST_VALUE))
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()
+    raise RuntimeError("Could not reserve account numbers: sequence row missing")
+
+class AccountNumberAllocator:
+    """Hands out account numbers from blocks reserved in number_sequences."""
+
+    def __init__(self, block_size: int = None):
+        self.block_size = block_size or settings.ACCOUNT_NUMBER_BLOCK_SIZE
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def allocate(self) -> str:
+        async with self._lock:
+            if self._next >= self._end:
+                self._next = await _reserve_block(self.block_size)
+                self._end = self._next + self.block_size
+            value = self._next
+            self._next += 1
+        return format_number(value)
+
+    async def allocate_many(self, count: int) -> list:
+        """Allocates `count` numbers, reserving one block big enough for the remainder."""
+        async with self._lock:
+            numbers = []
+            while len(numbers) < count:
+                if self._next >= self._end:
+                    size = max(self.block_size, count - len(numbers))
+                    self._next = await _reserve_block(size)
+                    self._end = self._next + size
+                take = min(count - len(numbers), self._end - self._next)
+                numbers.extend(range(self._next, self._next + take))
+                self._next += take
+        return [format_number(value) for value in numbers]
+
+# Shared allocator for the API process
+allocator = AccountNumberAllocator()
+
+async def allocate() -> str:
+    """Returns a new, never-before-issued account number."""
+    return await allocator.allocate()
@@ -0,0 +1,77 @@
+import itertools
+import time
+
+from sqlalchemy import event
+
+import database
+from cache import TTLCache
+from config import settings
+
+# --- Balance Cache ---
+# Account rows served by GET /accounts/{id}/balance, keyed by account_id.
+#
+# Every balance change goes through `ledger`, which marks the accounts it
+# touches on the session (`touch`). When that session commits or rolls back
+# (the stored procedures commit on their own, so a rollback may still follow a
+# change) the marked accounts get a new write stamp and their entries are
+# dropped.
+#
+# Readers take the account's write stamp before querying and only store what
+# they read if the stamp is unchanged, so a read that raced with a write can
+# never put the old balance back into the cache.
+#
+# The cache is per process and hits cost no query, so it can't see writes made
+# by other workers: those show up once the entry expires. Keep
+# BALANCE_CACHE_TTL_SECONDS short; it is the longest a balance served here can
+# lag a write made through another worker.
+
+_balances = TTLCache(settings.BALANCE_CACHE_SIZE, ttl=settings.BALANCE_CACHE_TTL_SECONDS, name="balance_cache")
+
+# account_id -> (write stamp, monotonic time of the write). Kept longer than
+# both the cached entries and the replica stickiness window.
+_writes = TTLCache(
+    settings.BALANCE_CACHE_SIZE,
+    ttl=max(settings.BALANCE_CACHE_TTL_SECONDS, settings.REPLICA_STICKY_SECONDS) + 60,
+)
+_stamps = itertools.count(1)
+
+_SESSION_KEY = "balance_cache.touched"
+
+def write_stamp(account_id: int) -> int:
+    """Current write stamp of an account; take it before reading the row."""
+    entry = _writes.get(account_id)
+    return entry[0] if entry else 0
+
+def get(account_id: int):
+    """Cached account data, or None."""
+    return _balances.get(account_id)
+
+def store(account_id: int, value: dict, stamp: int, from_replica: bool = False):
+    """
+    Caches account data read with write stamp `stamp`. Skipped if the account
+    was written since, or if the data came from a replica that may not have
+    caught up with a recent write yet.
+    """
+    entry = _writes.get(account_id)
+    if (entry[0] if entry else 0) != stamp:
+        return
+    if from_replica and entry and time.monotonic() - entry[1] < settings.REPLICA_STICKY_SECONDS:
+        return
+    _balances.set(account_id, value)
+
+def invalidate(*account_ids: int):
+    now = time.monotonic()
+    for account_id in account_ids:
+        _writes.set(account_id, (next(_stamps), now))
+        _balances.pop(account_id)
+
+def touch(db, *account_ids: int):
+    """Marks accounts whose balance this session is changing."""
+    db.info.setdefault(_SESSION_KEY, set()).update(account_ids)
+
+@event.listens_for(database.RoutingSession, "after_commit")
+@event.listens_for(database.RoutingSession, "after_rollback")
+def _invalidate_touched(session):
+    touched = session.info.pop(_SESSION_KEY, None)
+    if touched:
+        invalidate(*touched)
@@ -0,0 +1,52 @@
+"""
+Benchmark: account number allocation throughput.
+
+Allocates numbers from several concurrent tasks (like concurrent registrations)
+for a range of block sizes, checks that every number is unique and carries a
+valid check digit, and reports numbers/second and block reservations.
+Requires the number_sequences table (python init_db.py or init_db.py --migrate).
+
+Usage:
+    python bench_account_numbers.py --count 20000 --concurrency 16
+"""
+import argparse
+import asyncio
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import account_numbers, metrics
+
+async def run(block_size, count, concurrency):
+    allocator = account_numbers.AccountNumberAllocator(block_size)
+    numbers = []
+    per_task = count // concurrency
+
+    async def worker():
+        for _ in range(per_task):
+            numbers.append(await allocator.allocate())
+
+    blocks_before = metrics.get("account_numbers.blocks_reserved")
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    assert len(set(numbers)) == len(numbers), "duplicate account numbers"
+    assert all(account_numbers.is_valid(number) for number in numbers), "invalid check digit"
+    print(
+        f"block {block_size:>6}   {len(numbers) / elapsed:10.0f} numbers/s"
+        f"   blocks reserved {metrics.get('account_numbers.blocks_reserved') - blocks_before:6d}"
+    )
+
+async def main(args):
+    for block_size in args.block_sizes:
+        await run(block_size, args.count, args.concurrency)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--block-sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,54 @@
+"""
+Benchmark: verify_token with and without the verified-token cache.
+
+Mints one access token and verifies it repeatedly, the way a client reuses its
+token across requests. No database is needed.
+
+Usage:
+    python bench_jwt.py --iterations 100000
+"""
+import argparse
+import statistics
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+
+import dependencies, metrics
+
+credentials_exception = HTTPException(status_code=401, detail="Could not validate credentials")
+
+def run(name, verify, token, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        verify(token, credentials_exception)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(
+        f"{name:<10} mean {statistics.mean(timings) * 1e6:7.2f} us"
+        f"   p95 {timings[int(len(timings) * 0.95) - 1] * 1e6:7.2f} us"
+        f"   total {sum(timings):6.2f} s"
+    )
+
+def verify_uncached(token, credentials_exception):
+    dependencies.token_cache.clear()
+    return dependencies.verify_token(token, credentials_exception)
+
+def main(args):
+    token = dependencies.create_access_token(data={"sub": "bench-user"})
+    run("uncached", verify_uncached, token, args.iterations)
+    dependencies.token_cache.clear()
+    run("cached", dependencies.verify_token, token, args.iterations)
+    print(
+        f"cache hits {metrics.get('token_cache.hits')}"
+        f"   misses {metrics.get('token_cache.misses')}"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100000)
+    main(parser.parse_args())
@@ -0,0 +1,68 @@
+"""
+Benchmark: stored-procedure ledger path vs the direct guarded-UPDATE path.
+
+Runs deposits, withdrawals and transfers against two existing accounts and
+reports latency and the number of SQL statements each operation sends.
+Requires MySQL with the stored procedures installed (python init_db.py).
+
+Usage:
+    python bench_ledger.py --from-account 1 --to-account 2 --iterations 500
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+
+import database, ledger
+
+statement_count = 0
+
+@event.listens_for(database.async_engine.sync_engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    global statement_count
+    statement_count += 1
+
+async def run_operation(name, operation, iterations):
+    global statement_count
+    timings = []
+    statement_count = 0
+    for _ in range(iterations):
+        async with database.AsyncSessionLocal() as db:
+            start = time.perf_counter()
+            await operation(db)
+            await db.commit()
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(
+        f"{name:<28} mean {statistics.mean(timings) * 1000:7.2f} ms"
+        f"   p95 {timings[int(len(timings) * 0.95) - 1] * 1000:7.2f} ms"
+        f"   statements/op {statement_count / iterations:4.1f}"
+    )
+
+async def main(args):
+    a, b, amount = args.from_account, args.to_account, 1.0
+    paths = {
+        "procedure": (ledger.deposit_via_procedure, ledger.withdraw_via_procedure, ledger.transfer_via_procedure),
+        "direct": (ledger.deposit_direct, ledger.withdraw_direct, ledger.transfer_direct),
+    }
+    for path, (deposit, withdraw, transfer) in paths.items():
+        print(f"--- {path} ---")
+        await run_operation(f"{path} deposit", lambda db: deposit(db, a, amount), args.iterations)
+        await run_operation(f"{path} withdraw", lambda db: withdraw(db, a, amount), args.iterations)
+        await run_operation(f"{path} transfer", lambda db: transfer(db, a, b, amount), args.iterations)
+        # Move the transferred funds back so repeated runs leave balances unchanged
+        await run_operation(f"{path} transfer (back)", lambda db: transfer(db, b, a, amount), args.iterations)
+    await database.async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from-account", type=int, required=True)
+    parser.add_argument("--to-account", type=int, required=True)
+    parser.add_argument("--iterations", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,83 @@
+"""
+Benchmark: balance-read latency during a login storm.
+
+Measures GET /accounts/{id}/balance latency first on its own and then while
+many clients log in at once, against a running API server. Compare runs with
+the password worker pool enabled and disabled:
+
+    PASSWORD_POOL_WORKERS=2 uvicorn main:app     # bcrypt in worker processes
+    PASSWORD_POOL_WORKERS=0 uvicorn main:app     # bcrypt in the threadpool
+
+Requires httpx (pip install httpx).
+
+Usage:
+    python bench_login_storm.py --url http://localhost:8000 --logins 32 --seconds 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+PASSWORD = "bench-password"
+
+async def ensure_user(client, username):
+    await client.post("/auth/register", json={
+        "first_name": "Bench", "last_name": "User", "email": f"{username}@example.com",
+        "username": username, "password": PASSWORD, "initial_deposit": 100,
+    })
+    response = await client.post("/auth/login", json={"username": username, "password": PASSWORD})
+    response.raise_for_status()
+    body = response.json()
+    return body["access_token"], body["user"]["accounts"][0]["account_id"]
+
+async def read_balances(client, headers, account_id, stop_at, timings):
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        response = await client.get(f"/accounts/{account_id}/balance", headers=headers)
+        response.raise_for_status()
+        timings.append(time.perf_counter() - start)
+
+async def login_loop(client, username, stop_at, counts):
+    while time.perf_counter() < stop_at:
+        response = await client.post("/auth/login", json={"username": username, "password": PASSWORD})
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+
+def report(name, timings):
+    timings.sort()
+    print(
+        f"{name:<14} reads {len(timings):6d}"
+        f"   p50 {statistics.median(timings) * 1000:7.2f} ms"
+        f"   p99 {timings[int(len(timings) * 0.99) - 1] * 1000:7.2f} ms"
+        f"   max {timings[-1] * 1000:7.2f} ms"
+    )
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.logins + args.readers + 4)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        token, account_id = await ensure_user(client, "bench_reader")
+        headers = {"Authorization": f"Bearer {token}"}
+        await ensure_user(client, "bench_storm")
+
+        baseline = []
+        stop_at = time.perf_counter() + args.seconds
+        await asyncio.gather(*[read_balances(client, headers, account_id, stop_at, baseline) for _ in range(args.readers)])
+        report("baseline", baseline)
+
+        during_storm, counts = [], {}
+        stop_at = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            *[read_balances(client, headers, account_id, stop_at, during_storm) for _ in range(args.readers)],
+            *[login_loop(client, "bench_storm", stop_at, counts) for _ in range(args.logins)],
+        )
+        report("login storm", during_storm)
+        print(f"login responses by status: {dict(sorted(counts.items()))}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=32, help="concurrent clients logging in")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent clients reading balances")
+    parser.add_argument("--seconds", type=float, default=10)
+    asyncio.run(main(parser.parse_args()))
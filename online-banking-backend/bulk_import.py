@@ -0,0 +1,341 @@
+"""
+Bulk customer onboarding.
+
+Reads customers from CSV or NDJSON (one JSON object per line) with the same
+fields as POST /auth/register: first_name, last_name, email, username,
+password and an optional initial_deposit. Each chunk of rows is validated,
+its passwords are hashed in parallel, and customers, users, accounts and
+initial deposits are written with multi-row INSERTs in one commit.
+
+- Progress is printed after every chunk.
+- A checkpoint file records how many rows are done, so an interrupted run
+  continues where it stopped with --resume.
+- Rows that can't be imported (invalid fields, username or email taken) are
+  written to the error report with their row number and reason.
+
+Usage:
+    python bulk_import.py customers.csv --checkpoint import.checkpoint --errors import_errors.ndjson
+    python bulk_import.py customers.ndjson --resume --checkpoint import.checkpoint
+
+Admins can also upload a file through POST /admin/imports.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from itertools import islice
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+import account_numbers, database, dependencies, models, passwords, schemas
+from config import settings
+
+# --- Reading ---
+
+def detect_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+def read_rows(path: str, file_format: str):
+    """Yields (row_number, dict) for every row, 1-based, streaming from disk."""
+    with open(path, newline="", encoding="utf-8") as source:
+        if file_format == "csv":
+            for row_number, row in enumerate(csv.DictReader(source), start=1):
+                yield row_number, row
+        else:
+            row_number = 0
+            for line in source:
+                if not line.strip():
+                    continue
+                row_number += 1
+                try:
+                    yield row_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield row_number, {"_error": f"Invalid JSON: {e}"}
+
+# --- Progress ---
+
+class ImportProgress:
+    """Counters for one import run (exposed via GET /admin/imports/{id})."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.status = "running"
+        self.rows_done = 0
+        self.imported = 0
+        self.failed = 0
+        self.error = None
+        self.error_report = None
+        self.started_at = datetime.utcnow()
+        self.finished_at = None
+        self._started = time.perf_counter()
+
+    def rows_per_second(self) -> float:
+        elapsed = time.perf_counter() - self._started
+        return self.rows_done / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "source": self.source,
+            "status": self.status,
+            "rows_done": self.rows_done,
+            "imported": self.imported,
+            "failed": self.failed,
+            "rows_per_second": self.rows_per_second(),
+            "error": self.error,
+            "error_report": self.error_report,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+# --- Checkpoints ---
+
+def load_checkpoint(path: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {"rows_done": 0, "imported": 0, "failed": 0}
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(path: str, progress: ImportProgress):
+    if not path:
+        return
+    # Write then rename, so a crash never leaves a half-written checkpoint
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"rows_done": progress.rows_done, "imported": progress.imported, "failed": progress.failed}, f)
+    os.replace(temp_path, path)
+
+# --- Import ---
+
+async def _existing(db, column, values) -> set:
+    if not values:
+        return set()
+    result = await db.execute(select(column).where(column.in_(values)))
+    return set(result.scalars().all())
+
+async def import_chunk(rows: list, errors: list) -> int:
+    """
+    Imports one chunk in a single transaction and returns the number imported.
+    Rows that can't be imported are appended to `errors` as (row_number, username, reason).
+    """
+    valid = []
+    for row_number, row in rows:
+        if "_error" in row:
+            errors.append((row_number, None, row["_error"]))
+            continue
+        try:
+            if row.get("initial_deposit") in ("", None):
+                row = {**row, "initial_deposit": 0}
+            valid.append((row_number, schemas.UserCreate(**row)))
+        except ValidationError as e:
+            reason = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append((row_number, row.get("username"), reason))
+
+    async with database.AsyncSessionLocal() as db:
+        # Usernames and emails must be unique, both in the database and within the file
+        taken_usernames = await _existing(db, models.User.username, [user.username for _, user in valid])
+        taken_emails = await _existing(db, models.Customer.email, [user.email for _, user in valid])
+        customers = []
+        for row_number, user in valid:
+            if user.username in taken_usernames:
+                errors.append((row_number, user.username, "Username already exists."))
+            elif user.email in taken_emails:
+                errors.append((row_number, user.username, "Email already registered."))
+            else:
+                taken_usernames.add(user.username)
+                taken_emails.add(user.email)
+                customers.append(user)
+        # End the read transaction while hashing
+        await db.commit()
+        if not customers:
+            return 0
+
+        hashes = await passwords.hash_many([user.password for user in customers])
+        numbers = await account_numbers.allocator.allocate_many(len(customers))
+
+        # Multi-row INSERTs. MySQL can't return the generated ids of a
+        # multi-row insert reliably, so they are read back by unique key.
+        await db.execute(insert(models.Customer).values([
+            {"first_name": user.first_name, "last_name": user.last_name, "email": user.email}
+            for user in customers
+        ]))
+        customer_ids = dict((await db.execute(
+            select(models.Customer.email, models.Customer.customer_id)
+            .where(models.Customer.email.in_([user.email for user in customers]))
+        )).all())
+
+        await db.execute(insert(models.User).values([
+            {"customer_id": customer_ids[user.email], "username": user.username, "password_hash": password_hash}
+            for user, password_hash in zip(customers, hashes)
+        ]))
+
+        await db.execute(insert(models.Account).values([
+            {
+                "customer_id": customer_ids[user.email],
+                "account_number": number,
+                "account_type": "savings",
+                "balance": user.initial_deposit,
+            }
+            for user, number in zip(customers, numbers)
+        ]))
+
+        deposits = [(user, number) for user, number in zip(customers, numbers) if user.initial_deposit > 0]
+        if deposits:
+            account_ids = dict((await db.execute(
+                select(models.Account.account_number, models.Account.account_id)
+                .where(models.Account.account_number.in_([number for _, number in deposits]))
+            )).all())
+            await db.execute(insert(models.Transaction).values([
+                {
+                    "account_id": account_ids[number],
+                    "transaction_type": "deposit",
+                    "amount": user.initial_deposit,
+                    "description": "Initial account deposit",
+                }
+                for user, number in deposits
+            ]))
+
+        await db.commit()
+    # In case a principal with one of these usernames is still cached
+    for user in customers:
+        dependencies.invalidate_principal(user.username)
+    return len(customers)
+
+def _write_errors(error_path: str, errors: list):
+    if not error_path or not errors:
+        return
+    with open(error_path, "a", encoding="utf-8") as report:
+        for row_number, username, reason in errors:
+            report.write(json.dumps({"row": row_number, "username": username, "error": reason}) + "\n")
+
+async def run_import(
+    path: str,
+    file_format: str = None,
+    checkpoint_path: str = None,
+    error_path: str = None,
+    resume: bool = False,
+    chunk_size: int = None,
+    progress: ImportProgress = None,
+    on_progress=None,
+) -> ImportProgress:
+    """
+    Imports every row of `path`, committing every `chunk_size` rows.
+    - With `resume`, rows already covered by the checkpoint are skipped.
+    - `on_progress(progress)` is called after each chunk.
+    - File reads and writes (rows, error report, checkpoint) run in the
+      threadpool, so an import started through the API never blocks the event loop.
+    """
+    file_format = file_format or detect_format(path)
+    chunk_size = chunk_size or settings.BULK_IMPORT_CHUNK_SIZE
+    progress = progress or ImportProgress(path)
+    progress.error_report = error_path
+
+    if resume:
+        checkpoint = await run_in_threadpool(load_checkpoint, checkpoint_path)
+        progress.rows_done = checkpoint["rows_done"]
+        progress.imported = checkpoint["imported"]
+        progress.failed = checkpoint["failed"]
+
+    source = read_rows(path, file_format)
+    rows = islice(source, progress.rows_done, None)
+    try:
+        while True:
+            chunk = await run_in_threadpool(lambda: list(islice(rows, chunk_size)))
+            if not chunk:
+                break
+            errors = []
+            try:
+                imported = await import_chunk(chunk, errors)
+            except IntegrityError:
+                # A conflict the pre-checks missed (e.g. a username differing only
+                # in case). Import the rows one by one so only the culprit fails.
+                errors, imported = [], 0
+                for row in chunk:
+                    try:
+                        imported += await import_chunk([row], errors)
+                    except IntegrityError as e:
+                        errors.append((row[0], row[1].get("username"), f"Conflicts with an existing customer: {e.orig}"))
+            await run_in_threadpool(_write_errors, error_path, errors)
+
+            progress.rows_done += len(chunk)
+            progress.imported += imported
+            progress.failed += len(errors)
+            await run_in_threadpool(save_checkpoint, checkpoint_path, progress)
+            if on_progress:
+                on_progress(progress)
+    except Exception as e:
+        progress.status = "failed"
+        progress.error = str(e)
+        raise
+    finally:
+        source.close()
+        progress.finished_at = datetime.utcnow()
+    progress.status = "completed"
+    return progress
+
+# --- Background jobs (POST /admin/imports) ---
+
+# Import runs started through the API, keyed by job id
+jobs = {}
+_tasks = set()  # Keeps running job tasks referenced until they finish
+
+def start_job(path: str, file_format: str) -> str:
+    """Starts an import of an uploaded file in the background and returns its job id."""
+    job_id = uuid.uuid4().hex
+    progress = ImportProgress(os.path.basename(path))
+    error_path = f"{path}.errors.ndjson"
+
+    async def run():
+        try:
+            await run_import(path, file_format, checkpoint_path=f"{path}.checkpoint", error_path=error_path, progress=progress)
+        except Exception:
+            pass  # Recorded on the progress object
+
+    task = asyncio.get_running_loop().create_task(run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    jobs[job_id] = progress
+    return job_id
+
+# --- CLI ---
+
+def _print_progress(progress: ImportProgress):
+    print(
+        f"rows {progress.rows_done:>9}   imported {progress.imported:>9}"
+        f"   failed {progress.failed:>7}   {progress.rows_per_second():8.0f} rows/s",
+        flush=True,
+    )
+
+async def main(args):
+    try:
+        progress = await run_import(
+            args.path,
+            args.format,
+            checkpoint_path=args.checkpoint,
+            error_path=args.errors,
+            resume=args.resume,
+            chunk_size=args.chunk_size,
+            on_progress=_print_progress,
+        )
+    finally:
+        passwords.shutdown()
+    print(f"Done: {progress.imported} imported, {progress.failed} failed (see {args.errors}).")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV or NDJSON file of customers")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="defaults to the file extension")
+    parser.add_argument("--checkpoint", default="import.checkpoint", help="progress file used by --resume")
+    parser.add_argument("--errors", default="import_errors.ndjson", help="per-row error report (appended to)")
+    parser.add_argument("--resume", action="store_true", help="skip rows already imported according to --checkpoint")
+    parser.add_argument("--chunk-size", type=int, help=f"rows per commit (default {settings.BULK_IMPORT_CHUNK_SIZE})")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Bounded LRU cache with optional per-entry expiry. Thread-safe, so it can be
+    shared between the event loop and FastAPI's threadpool.
+    - `maxsize` caps the number of entries; the least recently used one is evicted.
+    - `ttl` (seconds) is the default lifetime of an entry; None keeps entries until evicted.
+    - With a `name`, hits/misses/evictions are counted as "<name>.hits" etc. in `metrics`.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = None, name: str = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()  # key -> (expires_at or None, value)
+        self._lock = threading.Lock()
+
+    def _count(self, event: str, amount: int = 1):
+        if self.name:
+            metrics.increment(f"{self.name}.{event}", amount)
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at is None or expires_at > now:
+                    self._data.move_to_end(key)
+                    self._count("hits")
+                    return value
+                del self._data[key]
+        self._count("misses")
+        return default
+
+    def set(self, key, value, ttl: float = None):
+        """Stores a value. `ttl` overrides the cache default for this entry."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        evicted = 0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self._count("evictions", evicted)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
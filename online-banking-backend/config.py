@@ -1,10 +1,128 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
+def _optional_int(name: str):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else None
+
 class Settings:
     SECRET_KEY: str = os.getenv("SECRET_KEY", "supersecret")
     DATABASE_URL: str = os.getenv("DATABASE_URL", "mysql+mysqlconnector://root:@127.0.0.1:3306/banking_system")
+    # Async driver URL used by the API. Defaults to the same database as DATABASE_URL
+    # through aiomysql; point it at "sqlite+aiosqlite:///./banking.db" for local tests.
+    ASYNC_DATABASE_URL: str = os.getenv(
+        "ASYNC_DATABASE_URL",
+        DATABASE_URL.replace("mysql+mysqlconnector://", "mysql+aiomysql://", 1),
+    )
+
+    # --- Connection pool ---
+    # Named profile from db_pool.POOL_PROFILES; the DB_POOL_* values below override it.
+    DB_POOL_PROFILE: str = os.getenv("DB_POOL_PROFILE", "default")
+    DB_POOL_SIZE = _optional_int("DB_POOL_SIZE")
+    DB_MAX_OVERFLOW = _optional_int("DB_MAX_OVERFLOW")
+    DB_POOL_RECYCLE = _optional_int("DB_POOL_RECYCLE")   # seconds
+    DB_POOL_TIMEOUT = _optional_int("DB_POOL_TIMEOUT")   # seconds to wait for a free connection
+    DB_POOL_LIVENESS = os.getenv("DB_POOL_LIVENESS") or None   # pre_ping | idle_ping | recycle
+    DB_POOL_IDLE_PING_SECONDS: int = int(os.getenv("DB_POOL_IDLE_PING_SECONDS", "30"))
+
+    # --- Read replicas ---
+    # Comma-separated async URLs; read-only endpoints are spread across them.
+    REPLICA_DATABASE_URLS = [url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()]
+    # How long a user's reads stay on the primary after they commit a write
+    REPLICA_STICKY_SECONDS: float = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+
+    # --- Transaction history paging ---
+    HISTORY_PAGE_SIZE: int = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+    HISTORY_MAX_PAGE_SIZE: int = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "100"))
+
+    # Maximum operations accepted by POST /transactions/batch
+    BATCH_MAX_OPERATIONS: int = int(os.getenv("BATCH_MAX_OPERATIONS", "1000"))
+
+    # How balance mutations are executed: "procedure" (stored procedures) or
+    # "direct" (guarded UPDATE + batched ledger INSERT, see ledger.py)
+    LEDGER_EXECUTION: str = os.getenv("LEDGER_EXECUTION", "procedure")
+
+    # Retries for transactions that lose a deadlock or hit a lock wait timeout
+    LOCK_RETRY_ATTEMPTS: int = int(os.getenv("LOCK_RETRY_ATTEMPTS", "3"))
+    LOCK_RETRY_BASE_DELAY_MS: float = float(os.getenv("LOCK_RETRY_BASE_DELAY_MS", "20"))
+    LOCK_RETRY_MAX_DELAY_MS: float = float(os.getenv("LOCK_RETRY_MAX_DELAY_MS", "500"))
+
+    # --- Idempotency keys ---
+    IDEMPOTENCY_CACHE_SIZE: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+    IDEMPOTENCY_TTL_HOURS: float = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+    # How long a duplicate waits for the original request before answering 409
+    IDEMPOTENCY_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+    # A pending key whose claim is older than this is taken over by the next
+    # request (its owner presumably crashed). Keep it above the slowest operation.
+    IDEMPOTENCY_LEASE_SECONDS: float = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+
+    # --- Principal cache (resolved users for authenticated requests) ---
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+    PRINCIPAL_CACHE_TTL_SECONDS: float = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+    # --- Access tokens ---
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+    # Verified-token cache; entries never outlive the token's own expiry
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+    TOKEN_CACHE_TTL_SECONDS: float = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+    # Embed the customer's account ids in access tokens so ownership checks skip the DB
+    TOKEN_ACCOUNT_SCOPES: bool = os.getenv("TOKEN_ACCOUNT_SCOPES", "true").lower() in ("1", "true", "yes")
+    TOKEN_SCOPE_MAX_ACCOUNTS: int = int(os.getenv("TOKEN_SCOPE_MAX_ACCOUNTS", "100"))
+
+    # --- Password hashing pool (bcrypt runs in separate processes) ---
+    # 0 runs hashing in the threadpool instead
+    PASSWORD_POOL_WORKERS: int = int(os.getenv("PASSWORD_POOL_WORKERS", "2"))
+    # Calls allowed to wait for a worker before new ones are rejected with 503
+    PASSWORD_QUEUE_SIZE: int = int(os.getenv("PASSWORD_QUEUE_SIZE", "64"))
+    PASSWORD_TIMEOUT_SECONDS: float = float(os.getenv("PASSWORD_TIMEOUT_SECONDS", "5"))
+    # Niceness added to the worker processes (0 keeps the same priority as the API)
+    PASSWORD_WORKER_NICE: int = int(os.getenv("PASSWORD_WORKER_NICE", "0"))
+    # bcrypt cost: calibrated at startup to fit BCRYPT_TARGET_MS, unless BCRYPT_ROUNDS
+    # pins it. Stored hashes outside [BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS] are
+    # rehashed on the next login.
+    BCRYPT_TARGET_MS: float = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+    BCRYPT_MIN_ROUNDS: int = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+    BCRYPT_MAX_ROUNDS: int = int(os.getenv("BCRYPT_MAX_ROUNDS", "14"))
+    BCRYPT_ROUNDS = _optional_int("BCRYPT_ROUNDS")
+
+    # --- Write-behind buffer (non-critical updates such as users.last_login) ---
+    WRITE_BEHIND_INTERVAL_SECONDS: float = float(os.getenv("WRITE_BEHIND_INTERVAL_SECONDS", "5"))
+    WRITE_BEHIND_MAX_ENTRIES: int = int(os.getenv("WRITE_BEHIND_MAX_ENTRIES", "500"))
+
+    # --- Account numbers (values reserved per process with one UPDATE) ---
+    ACCOUNT_NUMBER_BLOCK_SIZE: int = int(os.getenv("ACCOUNT_NUMBER_BLOCK_SIZE", "100"))
+
+    # --- Bulk customer import (bulk_import.py, POST /admin/imports) ---
+    BULK_IMPORT_CHUNK_SIZE: int = int(os.getenv("BULK_IMPORT_CHUNK_SIZE", "500"))
+    # Where uploaded import files, their checkpoints and error reports are kept
+    BULK_IMPORT_DIR: str = os.getenv("BULK_IMPORT_DIR", tempfile.gettempdir())
+
+    # --- Balance cache (GET /accounts/{id}/balance) ---
+    BALANCE_CACHE_SIZE: int = int(os.getenv("BALANCE_CACHE_SIZE", "50000"))
+    # Longest a cached balance can lag a write made through another worker process
+    BALANCE_CACHE_TTL_SECONDS: float = float(os.getenv("BALANCE_CACHE_TTL_SECONDS", "1"))
+
+    # --- Live account events (GET /events/stream) ---
+    # Events buffered per connection before it is told to resync instead
+    EVENTS_QUEUE_SIZE: int = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+    # Open streams per process; further connections get 503
+    EVENTS_MAX_SUBSCRIBERS: int = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "1000"))
+    # Comment line sent on idle streams so proxies don't close them
+    EVENTS_KEEPALIVE_SECONDS: float = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+    # Streams are closed after this long and the client reconnects, which
+    # re-checks its token and accounts and lets a graceful shutdown finish
+    EVENTS_MAX_STREAM_SECONDS: float = float(os.getenv("EVENTS_MAX_STREAM_SECONDS", "300"))
+
+    # Rows fetched from the server-side cursor per chunk of a statement export
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+    # --- Daily balance backfill (daily_balances.py) ---
+    # Account id ranges rebuilt concurrently, each on its own connection
+    DAILY_BALANCE_BACKFILL_WORKERS: int = int(os.getenv("DAILY_BALANCE_BACKFILL_WORKERS", "4"))
+    # Accounts per range; each range is one transaction
+    DAILY_BALANCE_BACKFILL_BATCH: int = int(os.getenv("DAILY_BALANCE_BACKFILL_BATCH", "1000"))
 
 settings = Settings()
@@ -0,0 +1,171 @@
+"""
+Daily balance snapshots.
+
+daily_balances holds one row per account and day with activity: the closing
+balance, credits, debits and the transaction count. The balance on any date
+is the closing balance of the account's latest row on or before it, a single
+primary key lookup, and GET /accounts/{id}/balance-history reads a date range
+of rows instead of the ledger.
+
+- On MySQL the `update_ledger_summaries` trigger (init_db.py) keeps today's
+  rows up to date as ledger rows are inserted.
+- The backfill rebuilds all days before --until from the ledger. Accounts are
+  split into id ranges of DAILY_BALANCE_BACKFILL_BATCH, and
+  DAILY_BALANCE_BACKFILL_WORKERS ranges are rebuilt concurrently, each with
+  one INSERT ... SELECT on its own connection. Closing balances are computed
+  back from the current balance, so ranges don't depend on each other.
+  Each range briefly holds read locks on its accounts' rows, so writes to
+  those accounts wait for it.
+
+Databases without the trigger (SQLite in development) can include today with
+--until set to tomorrow.
+
+Usage:
+    python daily_balances.py backfill
+    python daily_balances.py backfill --workers 8 --batch 500 --until 2026-10-18
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import case, delete, func, insert, select
+
+import database, models
+from config import settings
+from statements import CREDIT_TYPES, signed_amount
+
+transactions = models.Transaction.__table__
+accounts = models.Account.__table__
+daily = models.DailyBalance.__table__
+
+# --- Lookups ---
+
+async def balance_on(db, account_id: int, day: date):
+    """
+    Balance at the end of `day`, from at most two index lookups. None if the
+    account has no daily rows at all.
+    """
+    row = (await db.execute(
+        select(daily.c.closing_balance)
+        .where(daily.c.account_id == account_id, daily.c.day <= day)
+        .order_by(daily.c.day.desc())
+        .limit(1)
+    )).first()
+    if row:
+        return row.closing_balance
+    # No activity up to `day`: the balance is what the first active day started with
+    first = (await db.execute(
+        select(daily.c.closing_balance, daily.c.credits, daily.c.debits)
+        .where(daily.c.account_id == account_id)
+        .order_by(daily.c.day)
+        .limit(1)
+    )).first()
+    if first:
+        return first.closing_balance - first.credits + first.debits
+    return None
+
+# --- Backfill ---
+
+_COLUMNS = ["account_id", "day", "closing_balance", "credits", "debits", "transaction_count"]
+
+def _daily_rows(first_id: int, end_id: int, until: date):
+    """SELECT producing the daily_balances rows before `until` for accounts in [first_id, end_id)."""
+    day = func.date(transactions.c.transaction_date)
+    credit = case((transactions.c.transaction_type.in_(CREDIT_TYPES), transactions.c.amount), else_=0)
+    per_day = (
+        select(
+            transactions.c.account_id,
+            day.label("day"),
+            func.sum(credit).label("credits"),
+            func.sum(transactions.c.amount - credit).label("debits"),
+            func.count().label("transaction_count"),
+            func.sum(signed_amount(transactions)).label("net"),
+        )
+        .where(transactions.c.account_id >= first_id, transactions.c.account_id < end_id)
+        .group_by(transactions.c.account_id, day)
+        .subquery()
+    )
+
+    # Closing balance = current balance minus everything booked after that day
+    account_total = func.sum(per_day.c.net).over(partition_by=per_day.c.account_id)
+    running_total = func.sum(per_day.c.net).over(partition_by=per_day.c.account_id, order_by=per_day.c.day)
+    with_balances = (
+        select(
+            per_day.c.account_id,
+            per_day.c.day,
+            (accounts.c.balance - (account_total - running_total)).label("closing_balance"),
+            per_day.c.credits,
+            per_day.c.debits,
+            per_day.c.transaction_count,
+        )
+        .join(accounts, accounts.c.account_id == per_day.c.account_id)
+        .subquery()
+    )
+    return select(*(with_balances.c[name] for name in _COLUMNS)).where(with_balances.c.day < until)
+
+async def rebuild_range(first_id: int, end_id: int, until: date) -> int:
+    """Replaces the rows before `until` of accounts in [first_id, end_id) in one transaction."""
+    async with database.AsyncSessionLocal() as db:
+        await db.execute(
+            delete(daily).where(daily.c.account_id >= first_id, daily.c.account_id < end_id, daily.c.day < until)
+        )
+        result = await db.execute(insert(daily).from_select(_COLUMNS, _daily_rows(first_id, end_id, until)))
+        await db.commit()
+    return result.rowcount
+
+async def backfill(until: date = None, workers: int = None, batch: int = None, on_range=None) -> int:
+    """
+    Rebuilds every account's days before `until` (default: today), `workers`
+    account ranges at a time. Returns the number of rows written.
+    """
+    until = until or date.today()
+    workers = workers or settings.DAILY_BALANCE_BACKFILL_WORKERS
+    batch = batch or settings.DAILY_BALANCE_BACKFILL_BATCH
+
+    async with database.AsyncSessionLocal() as db:
+        low, high = (await db.execute(select(func.min(accounts.c.account_id), func.max(accounts.c.account_id)))).one()
+    if low is None:
+        return 0
+
+    ranges = asyncio.Queue()
+    for first_id in range(low, high + 1, batch):
+        ranges.put_nowait((first_id, first_id + batch))
+    written = 0
+
+    async def worker():
+        nonlocal written
+        while not ranges.empty():
+            first_id, end_id = ranges.get_nowait()
+            rows = await rebuild_range(first_id, end_id, until)
+            written += rows
+            if on_range:
+                on_range(first_id, end_id, rows)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return written
+
+# --- CLI ---
+
+async def main(args):
+    started = time.perf_counter()
+
+    def print_range(first_id, end_id, rows):
+        print(f"accounts {first_id:>9} - {end_id - 1:<9} {rows:>10} days   {time.perf_counter() - started:7.1f}s", flush=True)
+
+    until = date.fromisoformat(args.until) if args.until else None
+    total = await backfill(until, args.workers, args.batch, on_range=print_range)
+    print(f"Done: {total} daily balances in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    fill = commands.add_parser("backfill", help="rebuild all days before --until from the ledger")
+    fill.add_argument("--until", help=f"YYYY-MM-DD, exclusive (default: today, {date.today()})")
+    fill.add_argument("--workers", type=int, help=f"ranges rebuilt concurrently (default {settings.DAILY_BALANCE_BACKFILL_WORKERS})")
+    fill.add_argument("--batch", type=int, help=f"accounts per range (default {settings.DAILY_BALANCE_BACKFILL_BATCH})")
+    asyncio.run(main(parser.parse_args()))
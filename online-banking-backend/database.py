@@ -1,18 +1,134 @@
+import contextvars
+import hashlib
+import hmac
+import itertools
+import math
+import time
+from http.cookies import SimpleCookie
+from typing import Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 from config import settings
+import db_pool
 
 # Create the SQLAlchemy engine using the database URL from settings
-# The pool_pre_ping argument checks for "stale" connections and reconnects if necessary
+# Pool size, recycling and the liveness check come from the configured pool profile
 engine = create_engine(
     settings.DATABASE_URL,
-    pool_pre_ping=True
+    **db_pool.engine_options(settings.DATABASE_URL, "primary_sync")
 )
+db_pool.instrument_engine(engine, "primary_sync")
 
 # Create a configured "Session" class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by the API routers. Requests await their queries on the event
+# loop instead of holding one of FastAPI's threadpool slots while MySQL responds.
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    **db_pool.engine_options(settings.ASYNC_DATABASE_URL, "primary", is_async=True)
+)
+db_pool.instrument_engine(async_engine, "primary")
+
+# Optional read replicas. Sessions opened with info={"read_only": True} are routed
+# to one of these (round-robin); with no replicas configured everything uses the primary.
+replica_engines = []
+for index, replica_url in enumerate(settings.REPLICA_DATABASE_URLS):
+    replica_engine = create_async_engine(
+        replica_url,
+        **db_pool.engine_options(replica_url, f"replica_{index}", is_async=True)
+    )
+    replica_engines.append(db_pool.instrument_engine(replica_engine, f"replica_{index}"))
+_replica_cycle = itertools.cycle(replica_engines)
+
+class RoutingSession(Session):
+    """
+    Session that picks its engine per session rather than per model.
+    A read-only session sticks to a single replica so all of its queries
+    see the same snapshot; anything else goes to the primary.
+    """
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("read_only") and replica_engines:
+            if "replica" not in self.info:
+                self.info["replica"] = next(_replica_cycle)
+            return self.info["replica"].sync_engine
+        return async_engine.sync_engine
+
+# expire_on_commit=False keeps loaded attributes readable after commit; with an
+# AsyncSession an expired attribute would need an implicit (and illegal) lazy load.
+AsyncSessionLocal = async_sessionmaker(
+    class_=AsyncSession, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False
+)
+
+# --- Read-your-writes stickiness ---
+# Replicas lag the primary slightly, so a user who just moved money reads from the
+# primary for REPLICA_STICKY_SECONDS afterwards. The time of the last write travels
+# with the client in a signed cookie, so whichever worker serves the next read
+# knows about it.
+# - mark_write() notes the write on the current request; WriteMarkerMiddleware
+#   turns that into a Set-Cookie on the response.
+# - recently_wrote() checks the cookie sent with a later request.
+WRITE_MARKER_COOKIE = "last_write"
+_pending_write = contextvars.ContextVar("pending_write", default=None)
+
+def _sign_write_marker(user_id: int, written_at: float) -> str:
+    value = f"{user_id}.{written_at:.3f}"
+    signature = hmac.new(settings.SECRET_KEY.encode(), value.encode(), hashlib.sha256).hexdigest()
+    return f"{value}.{signature}"
+
+def mark_write(user_id: int):
+    """Records that the current request committed a write, pinning the user's next reads to the primary."""
+    pending = _pending_write.get()
+    if pending is not None:
+        pending["user_id"] = user_id
+        pending["written_at"] = time.time()
+
+def recently_wrote(marker: Optional[str], user_id: int) -> bool:
+    """True if `marker` (the cookie value) is validly signed for the user and still inside the window."""
+    if not marker:
+        return False
+    try:
+        value, _ = marker.rsplit(".", 1)
+        marker_user, written_at = value.split(".", 1)
+        marker_user, written_at = int(marker_user), float(written_at)
+    except ValueError:
+        return False
+    if marker_user != user_id or not hmac.compare_digest(marker, _sign_write_marker(marker_user, written_at)):
+        return False
+    return time.time() - written_at < settings.REPLICA_STICKY_SECONDS
+
+class WriteMarkerMiddleware:
+    """ASGI middleware setting the write-marker cookie on responses to requests that called mark_write()."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        pending = {}
+        token = _pending_write.set(pending)
+
+        async def send_with_marker(message):
+            if message["type"] == "http.response.start" and pending:
+                cookie = SimpleCookie()
+                cookie[WRITE_MARKER_COOKIE] = _sign_write_marker(pending["user_id"], pending["written_at"])
+                cookie[WRITE_MARKER_COOKIE].update({
+                    "max-age": math.ceil(settings.REPLICA_STICKY_SECONDS), "path": "/", "httponly": True, "samesite": "lax",
+                })
+                header = cookie[WRITE_MARKER_COOKIE].OutputString().encode("latin-1")
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", header)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_marker)
+        finally:
+            _pending_write.reset(token)
+
 # Create a Base class for our SQLAlchemy models to inherit from
 Base = declarative_base()
 
@@ -26,3 +142,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """
+    FastAPI dependency that provides an async database session.
+    It ensures the session is always closed after the request.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,214 @@
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from config import settings
+
+# --- Pool Profiles ---
+# Each profile is a starting point; any DB_POOL_* environment variable overrides
+# the matching value (see config.Settings).
+#
+# Liveness strategies:
+#   "pre_ping"  - SQLAlchemy's ping on every checkout (one extra round trip per request).
+#   "idle_ping" - ping only connections that sat idle in the pool longer than
+#                 DB_POOL_IDLE_PING_SECONDS; busy connections are reused without a ping.
+#   "recycle"   - never ping; rely on pool_recycle and on SQLAlchemy invalidating
+#                 connections that raise disconnect errors.
+POOL_PROFILES = {
+    "default": {
+        "pool_size": 10,
+        "max_overflow": 10,
+        "pool_recycle": 1800,
+        "pool_timeout": 10,
+        "liveness": "idle_ping",
+    },
+    "high_concurrency": {
+        "pool_size": 30,
+        "max_overflow": 20,
+        "pool_recycle": 1800,
+        "pool_timeout": 5,
+        "liveness": "idle_ping",
+    },
+    "low_footprint": {
+        "pool_size": 2,
+        "max_overflow": 3,
+        "pool_recycle": 900,
+        "pool_timeout": 30,
+        "liveness": "recycle",
+    },
+}
+
+LIVENESS_STRATEGIES = ("pre_ping", "idle_ping", "recycle")
+
+
+def resolve_profile() -> dict:
+    """Returns the configured pool profile with any per-setting overrides applied."""
+    if settings.DB_POOL_PROFILE not in POOL_PROFILES:
+        raise ValueError(
+            f"Unknown DB_POOL_PROFILE '{settings.DB_POOL_PROFILE}'. "
+            f"Expected one of: {', '.join(POOL_PROFILES)}"
+        )
+    profile = dict(POOL_PROFILES[settings.DB_POOL_PROFILE])
+    overrides = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "liveness": settings.DB_POOL_LIVENESS,
+    }
+    profile.update({key: value for key, value in overrides.items() if value is not None})
+    if profile["liveness"] not in LIVENESS_STRATEGIES:
+        raise ValueError(
+            f"Unknown DB_POOL_LIVENESS '{profile['liveness']}'. "
+            f"Expected one of: {', '.join(LIVENESS_STRATEGIES)}"
+        )
+    return profile
+
+
+# --- Pool Statistics ---
+
+class PoolStats:
+    """Thread-safe checkout counters for one engine's pool."""
+
+    def __init__(self, name: str, window: int = 1000):
+        self.name = name
+        self._lock = threading.Lock()
+        self._recent_waits = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.liveness_pings = 0
+
+    def record_checkout(self, wait: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._recent_waits.append(wait)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_ping(self):
+        with self._lock:
+            self.liveness_pings += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent_waits)
+            p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "liveness_pings": self.liveness_pings,
+                "avg_wait_ms": (self.total_wait / self.checkouts * 1000) if self.checkouts else 0.0,
+                "p95_wait_ms": p95 * 1000,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+class _TimedPoolMixin:
+    """Measures how long each checkout waits for a connection."""
+
+    stats: PoolStats = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.record_timeout()
+            raise
+        self.stats.record_checkout(time.perf_counter() - start)
+        return connection
+
+
+# Stats for every instrumented engine, keyed by engine name (exposed via /admin/pool)
+pool_registry = {}
+
+
+def _install_idle_ping(engine, stats: PoolStats, idle_seconds: int):
+    """Pings a connection on checkout only if it has been idle longer than idle_seconds."""
+
+    @event.listens_for(engine.pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        connection_record.info["last_checkin"] = time.monotonic()
+
+    @event.listens_for(engine.pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        last_checkin = connection_record.info.get("last_checkin")
+        if last_checkin is None or time.monotonic() - last_checkin < idle_seconds:
+            return
+        stats.record_ping()
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception:
+            # Tells the pool to discard this connection and retry with a fresh one
+            raise exc.DisconnectionError()
+        finally:
+            cursor.close()
+
+
+def engine_options(url: str, name: str, is_async: bool = False) -> dict:
+    """
+    Builds create_engine/create_async_engine keyword arguments for the configured profile.
+    SQLite URLs keep SQLAlchemy's defaults since they don't use a QueuePool.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+
+    profile = resolve_profile()
+    stats = PoolStats(name)
+    base = AsyncAdaptedQueuePool if is_async else QueuePool
+    poolclass = type(f"Timed{base.__name__}", (_TimedPoolMixin, base), {"stats": stats})
+    pool_registry[name] = {"stats": stats, "profile": profile, "engine": None}
+
+    return {
+        "poolclass": poolclass,
+        "pool_size": profile["pool_size"],
+        "max_overflow": profile["max_overflow"],
+        "pool_recycle": profile["pool_recycle"],
+        "pool_timeout": profile["pool_timeout"],
+        "pool_pre_ping": profile["liveness"] == "pre_ping",
+    }
+
+
+def instrument_engine(engine, name: str):
+    """Registers an engine built from engine_options() and installs its liveness hooks."""
+    entry = pool_registry.get(name)
+    if entry is None:
+        return engine
+    entry["engine"] = engine
+    if entry["profile"]["liveness"] == "idle_ping":
+        sync_engine = getattr(engine, "sync_engine", engine)
+        _install_idle_ping(sync_engine, entry["stats"], settings.DB_POOL_IDLE_PING_SECONDS)
+    return engine
+
+
+def pool_status() -> list:
+    """Current pool gauges and checkout statistics for every instrumented engine."""
+    report = []
+    for name, entry in pool_registry.items():
+        engine = entry["engine"]
+        if engine is None:
+            continue
+        pool = getattr(engine, "sync_engine", engine).pool
+        report.append({
+            "name": name,
+            "profile": settings.DB_POOL_PROFILE,
+            "liveness": entry["profile"]["liveness"],
+            "pool_size": pool.size(),
+            "max_overflow": entry["profile"]["max_overflow"],
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow_in_use": max(pool.overflow(), 0),
+            **entry["stats"].snapshot(),
+        })
+    return report
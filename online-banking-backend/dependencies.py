@@ -1,46 +1,178 @@
+import hashlib
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 import jwt
+from typing import Optional
 
 import models, schemas
-from database import get_db
+import database
+from cache import TTLCache
+from database import get_async_db
 from config import settings
 
 # This would be for JWT in headers, but we'll use a cookie instead.
 # It can be kept for other uses or if you switch later.
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+# Same, but yields None instead of a 401 when no token is sent (used by logout)
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 # --- JWT/Cookie Helper Functions ---
 
+def account_scope_claims(customer_id: int, account_ids) -> dict:
+    """
+    Claims that let routers authorize account access from the token alone:
+    "cid" (customer id) and "acc" (owned account ids). Omitted when disabled or
+    when the customer has more than TOKEN_SCOPE_MAX_ACCOUNTS accounts.
+    """
+    account_ids = sorted(account_ids)
+    if not settings.TOKEN_ACCOUNT_SCOPES or len(account_ids) > settings.TOKEN_SCOPE_MAX_ACCOUNTS:
+        return {}
+    return {"cid": customer_id, "acc": account_ids}
+
 def create_access_token(data: dict):
-    """Creates a JWT access token."""
+    """Creates a JWT access token that expires after ACCESS_TOKEN_EXPIRE_MINUTES."""
     to_encode = data.copy()
-    # For simplicity, we are not setting an expiry time.
-    # In a real app, you should add:
-    # expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    # to_encode.update({"exp": expire})
+    expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
+# --- Verified Token Cache ---
+# Verified claims keyed by a digest of the token, so a token reused across many
+# requests is only decoded and HMAC-checked once. Each entry lives until the
+# token's own `exp`, never longer than TOKEN_CACHE_TTL_SECONDS.
+token_cache = TTLCache(settings.TOKEN_CACHE_SIZE, name="token_cache")
+
+# --- Revoked Tokens ---
+# Digests of tokens revoked by logout, mapped to the token's `exp`. Unlike the
+# caches this store never evicts: an entry is only dropped once its token has
+# expired and would be rejected anyway, so a revoked token stays revoked for
+# its whole lifetime. Revocations are kept per process.
+_revoked_tokens = {}  # digest -> exp (unix time)
+_revocation_expiry = []  # heap of (exp, digest), to prune expired entries in order
+_revocation_lock = threading.Lock()
+
+def _prune_revocations(now: float):
+    while _revocation_expiry and _revocation_expiry[0][0] <= now:
+        _, digest = heapq.heappop(_revocation_expiry)
+        if _revoked_tokens.get(digest, now) <= now:
+            _revoked_tokens.pop(digest, None)
+
+def is_revoked(digest: str) -> bool:
+    exp = _revoked_tokens.get(digest)
+    return exp is not None and exp > time.time()
+
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _remaining_lifetime(exp) -> float:
+    if exp is None:
+        return settings.TOKEN_CACHE_TTL_SECONDS
+    return min(exp - time.time(), settings.TOKEN_CACHE_TTL_SECONDS)
+
+def revoke_token(token: str):
+    """Revokes a token for the rest of its lifetime and evicts its cached claims."""
+    digest = _token_digest(token)
+    token_cache.pop(digest)
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    except jwt.PyJWTError:
+        return  # Already invalid; nothing to revoke
+    exp = payload.get("exp", float("inf"))  # No exp: the token never expires, so neither does its revocation
+    with _revocation_lock:
+        _prune_revocations(time.time())
+        _revoked_tokens[digest] = exp
+        heapq.heappush(_revocation_expiry, (exp, digest))
+
 def verify_token(token: str, credentials_exception):
-    """Decodes and verifies a JWT token."""
+    """
+    Decodes and verifies a JWT token, using the verified-token cache when possible.
+    Revocation is checked first, so a revoked token is rejected even while its
+    claims are still cached.
+    """
+    digest = _token_digest(token)
+    if is_revoked(digest):
+        raise credentials_exception
+
+    token_data = token_cache.get(digest)
+    if token_data is not None:
+        return token_data
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        return schemas.TokenData(username=username)
     except jwt.PyJWTError:
         raise credentials_exception
 
+    account_ids = payload.get("acc")
+    token_data = schemas.TokenData(
+        username=username,
+        customer_id=payload.get("cid"),
+        account_ids=frozenset(account_ids) if account_ids is not None else None,
+    )
+    lifetime = _remaining_lifetime(payload.get("exp"))
+    if lifetime > 0:
+        token_cache.set(digest, token_data, ttl=lifetime)
+    return token_data
+
+# --- Principal Cache ---
+# Resolved users keyed by token subject (username). Only plain column values are
+# cached (never the password hash or ORM instances), so entries are safe to share
+# across sessions and threads.
+#
+# Code that changes a users row calls invalidate_principal() once it commits
+# (password rehashes, bulk imports). That only reaches this process: other
+# workers, and changes made outside the API (e.g. a role set in SQL), are seen
+# once the entry expires, after PRINCIPAL_CACHE_TTL_SECONDS.
+_PRINCIPAL_COLUMNS = ("user_id", "customer_id", "username", "role", "last_login", "created_at")
+
+principal_cache = TTLCache(
+    settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    name="principal_cache",
+)
+
+def invalidate_principal(username: str):
+    """Drops a cached principal. Call after changing anything on the user row."""
+    principal_cache.pop(username)
+
+def remember_principal(user: models.User):
+    """Caches (or refreshes) a user the caller has just loaded or updated."""
+    principal_cache.set(user.username, {column: getattr(user, column) for column in _PRINCIPAL_COLUMNS})
+
+def _attach_cached_user(db: AsyncSession, snapshot: dict) -> models.User:
+    """
+    Rebuilds a User from a cached snapshot and attaches it to the session as a
+    persistent instance without querying, so handlers can still refresh it or
+    load its relationships like a freshly selected row.
+    """
+    existing = db.identity_map.get((models.User, (snapshot["user_id"],), None))
+    if existing is not None:
+        return existing
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    db.add(user)
+    return user
+
 # --- Main Dependency for Getting Current User ---
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+    request: Request, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
 ) -> models.User:
     """
     Dependency to get the current user from the JWT token in the Authorization header.
+    - Users are served from `principal_cache` for up to PRINCIPAL_CACHE_TTL_SECONDS,
+      so most requests skip the users lookup entirely.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -48,12 +180,26 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    # Resolve the principal once per request, even if the dependency is
+    # declared at several levels (router, handler, get_read_db).
+    cached = getattr(request.state, "current_user", None)
+    if cached is not None:
+        return cached
+
     token_data = verify_token(token, credentials_exception)
-    
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
-    if user is None:
-        raise credentials_exception
-        
+
+    snapshot = principal_cache.get(token_data.username)
+    if snapshot is not None:
+        user = _attach_cached_user(db, snapshot)
+    else:
+        result = await db.execute(select(models.User).where(models.User.username == token_data.username))
+        user = result.scalars().first()
+        if user is None:
+            raise credentials_exception
+        remember_principal(user)
+
+    request.state.token_data = token_data
+    request.state.current_user = user
     return user
 
 async def get_current_active_user(
@@ -66,3 +212,41 @@ async def get_current_active_user(
     # if current_user.disabled:
     #     raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+async def get_current_admin_user(
+    current_user: models.User = Depends(get_current_active_user),
+) -> models.User:
+    """
+    Restricts an endpoint to users with the 'admin' role.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
+async def get_account_scope(
+    request: Request, current_user: models.User = Depends(get_current_active_user)
+) -> Optional[frozenset]:
+    """
+    Account ids the token says the user owns, or None if it carries no scope.
+    The scope can be stale only in one direction (accounts opened after the
+    token was issued are missing), so callers fall back to the DB on a miss.
+    """
+    token_data = getattr(request.state, "token_data", None)
+    if token_data is None or token_data.account_ids is None:
+        return None
+    if token_data.customer_id != current_user.customer_id:
+        return None
+    return token_data.account_ids
+
+# --- Read Routing ---
+
+async def get_read_db(request: Request, current_user: models.User = Depends(get_current_active_user)):
+    """
+    Session for read-only endpoints. Routed to a read replica, unless the request
+    carries the user's write-marker cookie from the last REPLICA_STICKY_SECONDS,
+    in which case the primary is used so they always see their own changes.
+    """
+    marker = request.cookies.get(database.WRITE_MARKER_COOKIE)
+    read_only = not database.recently_wrote(marker, current_user.user_id)
+    async with database.AsyncSessionLocal(info={"read_only": read_only}) as db:
+        yield db
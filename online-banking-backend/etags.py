@@ -0,0 +1,39 @@
+import hashlib
+
+from fastapi import Request, Response, status
+
+# --- Conditional GET helpers ---
+# Account responses are tagged with the accounts' `version` column, which every
+# balance change increments, so a client can revalidate with If-None-Match and
+# get an empty 304 instead of the full payload.
+
+# Clients may keep responses but must revalidate them before each use
+CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the given parts, e.g. make_etag("a", 12, "v", 7) -> '"a-12-v-7"'."""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+def version_digest(rows) -> str:
+    """Short digest of (account_id, version) pairs, for responses covering several accounts."""
+    joined = ",".join(f"{account_id}:{version}" for account_id, version in rows)
+    return hashlib.sha256(joined.encode()).hexdigest()[:32]
+
+def matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match already names `etag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    candidates = (candidate.strip() for candidate in header.split(","))
+    return etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+def tag(response: Response, etag: str):
+    """Adds the ETag and revalidation headers to a full response."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+import database, metrics, models
+from cache import TTLCache
+from config import settings
+
+# Idempotency keys for money-moving endpoints.
+#
+# A client sends an `Idempotency-Key` header; the first request with a given key
+# runs and its outcome is stored, later requests with the same key get that stored
+# outcome back without touching balances.
+#
+# - The `idempotency_keys` table is the source of truth and works across workers:
+#   the first request claims the key by inserting a pending row (the primary key
+#   makes this race-free), and fills in the response once the operation finishes.
+#   The row records when it was claimed; if its request dies before starting the
+#   operation, the claim goes stale after IDEMPOTENCY_LEASE_SECONDS and can be
+#   taken over.
+# - The row is marked `executing` before the operation runs. From then on the
+#   money may have moved, so the claim is never taken over: if its outcome is
+#   never stored, duplicates get a 409 until the key expires.
+# - A bounded in-process LRU of finished outcomes serves repeats without a query.
+# - Concurrent duplicates in the same process wait on the first request's future;
+#   duplicates in another process poll the pending row.
+#
+# Successful and 4xx outcomes are stored (retrying them would give the same answer).
+# A 5xx from the operation releases the key so the client can retry for real: the
+# routers roll back before raising one. Anything else leaves the outcome unknown,
+# and the key stays executing.
+
+MAX_KEY_LENGTH = 255
+
+_completed = TTLCache(
+    maxsize=settings.IDEMPOTENCY_CACHE_SIZE,
+    ttl=settings.IDEMPOTENCY_TTL_HOURS * 3600,
+    name="idempotency.cache",
+)
+_inflight = {}  # (user_id, key) -> Future resolved with the stored outcome, or None if released
+
+def _fingerprint(endpoint: str, payload: dict) -> str:
+    canonical = json.dumps({"endpoint": endpoint, "payload": jsonable_encoder(payload)}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def _replay(outcome: dict, request_hash: str):
+    if outcome["request_hash"] != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="This Idempotency-Key was already used with a different request."
+        )
+    return JSONResponse(
+        status_code=outcome["status_code"],
+        content=outcome["body"],
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+def _outcome(record) -> dict:
+    return {
+        "request_hash": record.request_hash,
+        "status_code": record.status_code,
+        "body": json.loads(record.response_body),
+    }
+
+keys = models.IdempotencyKey.__table__
+
+def _now() -> datetime:
+    # Whole seconds, as a DATETIME column stores them: claimed_at is compared for equality
+    return datetime.utcnow().replace(microsecond=0)
+
+def _this_key(user_id: int, key: str):
+    return (keys.c.user_id == user_id) & (keys.c.idempotency_key == key)
+
+async def _insert(db, user_id: int, key: str, request_hash: str, now: datetime) -> bool:
+    """Inserts a pending row; False if the key already has one."""
+    try:
+        await db.execute(insert(keys).values(
+            user_id=user_id, idempotency_key=key, request_hash=request_hash, created_at=now, claimed_at=now
+        ))
+        await db.commit()
+        return True
+    except IntegrityError:
+        await db.rollback()
+        return False
+
+async def _take_over(db, user_id: int, key: str, request_hash: str, seen_claimed_at: datetime, now: datetime) -> bool:
+    """
+    Resets an expired or abandoned row to a fresh pending claim. Guarded on the
+    claim time that was read, so of several requests taking over only one wins.
+    """
+    result = await db.execute(
+        update(keys)
+        .where(_this_key(user_id, key), keys.c.claimed_at == seen_claimed_at)
+        .values(
+            request_hash=request_hash, status_code=None, response_body=None,
+            created_at=now, claimed_at=now, executing=False,
+        )
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def _claim(user_id: int, key: str, request_hash: str):
+    """
+    Claims the key. Returns (claimed_at, None) if this request now owns it, or
+    (None, outcome) once another request that owns it has finished.
+    - The pending row is inserted once; duplicates then poll it with a plain SELECT.
+    - A row older than IDEMPOTENCY_TTL_HOURS, or one whose operation never
+      started within IDEMPOTENCY_LEASE_SECONDS (its request died), is taken over.
+    - A row whose operation started but never stored an outcome answers 409:
+      the operation may have been applied, so it must not run again.
+    """
+    deadline = asyncio.get_running_loop().time() + settings.IDEMPOTENCY_WAIT_SECONDS
+    async with database.AsyncSessionLocal() as db:
+        now = _now()
+        if await _insert(db, user_id, key, request_hash, now):
+            return now, None
+
+        while True:
+            record = (await db.execute(select(keys).where(_this_key(user_id, key)))).first()
+            await db.rollback()  # End the read, so the next poll sees a fresh snapshot
+            now = _now()
+
+            if record is None:
+                # Released in the meantime; claim it again
+                if await _insert(db, user_id, key, request_hash, now):
+                    return now, None
+                continue
+            expired = record.created_at < now - timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+            stale = record.status_code is None and record.claimed_at < now - timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)
+            abandoned = stale and not record.executing
+            if expired or abandoned:
+                if await _take_over(db, user_id, key, request_hash, record.claimed_at, now):
+                    if abandoned:
+                        metrics.increment("idempotency.lease_takeovers")
+                    return now, None
+                continue
+            if record.status_code is not None:
+                return None, _outcome(record)
+            if stale:
+                metrics.increment("idempotency.outcome_unknown")
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key did not finish and may have been applied. "
+                           "Check the account before retrying with a new key."
+                )
+            if asyncio.get_running_loop().time() > deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still being processed."
+                )
+            await asyncio.sleep(0.1)
+
+async def _start(user_id: int, key: str, claimed_at: datetime):
+    """Marks our claim as executing, just before the operation runs."""
+    async with database.AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(keys)
+            .where(_this_key(user_id, key), keys.c.claimed_at == claimed_at, keys.c.status_code.is_(None))
+            .values(executing=True)
+        )
+        await db.commit()
+    if result.rowcount != 1:
+        # Our lease ran out before the operation even started
+        metrics.increment("idempotency.lease_lost")
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed."
+        )
+
+async def _store(user_id: int, key: str, claimed_at: datetime, outcome: dict):
+    async with database.AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(keys)
+            .where(_this_key(user_id, key), keys.c.claimed_at == claimed_at)
+            .values(status_code=outcome["status_code"], response_body=json.dumps(outcome["body"]))
+        )
+        await db.commit()
+    if result.rowcount != 1:
+        # Our lease ran out and another request took the key over
+        metrics.increment("idempotency.lease_lost")
+
+async def _release(user_id: int, key: str, claimed_at: datetime):
+    async with database.AsyncSessionLocal() as db:
+        await db.execute(delete(keys).where(_this_key(user_id, key), keys.c.claimed_at == claimed_at))
+        await db.commit()
+
+async def run(user_id: int, key, endpoint: str, payload: dict, operation):
+    """
+    Runs `operation` (an async callable returning the response body) at most once
+    per (user, Idempotency-Key). Without a key the operation simply runs.
+    """
+    if key is None:
+        return await operation()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters."
+        )
+
+    request_hash = _fingerprint(endpoint, payload)
+    cache_key = (user_id, key)
+
+    while True:
+        outcome = _completed.get(cache_key)
+        if outcome is not None:
+            return _replay(outcome, request_hash)
+        inflight = _inflight.get(cache_key)
+        if inflight is None:
+            break
+        outcome = await asyncio.shield(inflight)
+        if outcome is not None:
+            return _replay(outcome, request_hash)
+        # The first request failed without storing an outcome; take our own turn
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[cache_key] = future
+    outcome = None
+    try:
+        claimed_at, outcome = await _claim(user_id, key, request_hash)
+        if outcome is not None:
+            _completed.set(cache_key, outcome)
+            return _replay(outcome, request_hash)
+
+        await _start(user_id, key, claimed_at)
+        try:
+            body = await operation()
+            outcome = {"request_hash": request_hash, "status_code": status.HTTP_200_OK, "body": jsonable_encoder(body)}
+        except HTTPException as e:
+            if e.status_code >= 500:
+                await _release(user_id, key, claimed_at)
+                raise
+            outcome = {"request_hash": request_hash, "status_code": e.status_code, "body": {"detail": e.detail}}
+            await _store(user_id, key, claimed_at, outcome)
+            _completed.set(cache_key, outcome)
+            raise
+        except BaseException:
+            # The operation may have committed before failing; keep the key executing
+            metrics.increment("idempotency.outcome_unknown")
+            raise
+
+        await _store(user_id, key, claimed_at, outcome)
+        _completed.set(cache_key, outcome)
+        return body
+    finally:
+        _inflight.pop(cache_key, None)
+        future.set_result(outcome)
@@ -7,6 +7,185 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from database import engine
 from sqlalchemy import text
 
+# Triggers and stored procedures. Each is dropped first so both init_db() and
+# migrate_db() can (re)install the current definitions.
+TRIGGERS_SQL = [
+    "DROP TRIGGER IF EXISTS prevent_negative_balance",
+    """CREATE TRIGGER prevent_negative_balance
+       BEFORE UPDATE ON accounts
+       FOR EACH ROW
+       BEGIN
+           IF NEW.balance < 0 THEN
+               SIGNAL SQLSTATE '45000'
+               SET MESSAGE_TEXT = 'Insufficient funds: Balance cannot be negative.';
+           END IF;
+       END""",
+
+    # Keeps today's daily_balances row and the current month of statement_periods
+    # up to date (see daily_balances.py and statements.py). Balances are updated
+    # before the ledger row is inserted, on both ledger paths, so
+    # accounts.balance is the balance right after this transaction.
+    "DROP TRIGGER IF EXISTS update_statement_period",  # Previous name of this trigger
+    "DROP TRIGGER IF EXISTS update_ledger_summaries",
+    """CREATE TRIGGER update_ledger_summaries
+       AFTER INSERT ON transactions
+       FOR EACH ROW
+       BEGIN
+           DECLARE v_balance DECIMAL(15, 2);
+           DECLARE v_credit DECIMAL(15, 2);
+           DECLARE v_debit DECIMAL(15, 2);
+
+           SELECT balance INTO v_balance FROM accounts WHERE account_id = NEW.account_id;
+           SET v_credit = IF(NEW.transaction_type IN ('deposit', 'transfer_in'), NEW.amount, 0);
+           SET v_debit = NEW.amount - v_credit;
+
+           INSERT INTO statement_periods (account_id, period_start, opening_balance, closing_balance,
+                                          deposits, withdrawals, transfers_in, transfers_out, transaction_count)
+           VALUES (
+               NEW.account_id,
+               DATE_SUB(DATE(NEW.transaction_date), INTERVAL DAYOFMONTH(NEW.transaction_date) - 1 DAY),
+               v_balance - v_credit + v_debit,
+               v_balance,
+               IF(NEW.transaction_type = 'deposit', NEW.amount, 0),
+               IF(NEW.transaction_type = 'withdrawal', NEW.amount, 0),
+               IF(NEW.transaction_type = 'transfer_in', NEW.amount, 0),
+               IF(NEW.transaction_type = 'transfer_out', NEW.amount, 0),
+               1
+           )
+           ON DUPLICATE KEY UPDATE
+               closing_balance = v_balance,
+               deposits = deposits + IF(NEW.transaction_type = 'deposit', NEW.amount, 0),
+               withdrawals = withdrawals + IF(NEW.transaction_type = 'withdrawal', NEW.amount, 0),
+               transfers_in = transfers_in + IF(NEW.transaction_type = 'transfer_in', NEW.amount, 0),
+               transfers_out = transfers_out + IF(NEW.transaction_type = 'transfer_out', NEW.amount, 0),
+               transaction_count = transaction_count + 1;
+
+           INSERT INTO daily_balances (account_id, day, closing_balance, credits, debits, transaction_count)
+           VALUES (NEW.account_id, DATE(NEW.transaction_date), v_balance, v_credit, v_debit, 1)
+           ON DUPLICATE KEY UPDATE
+               closing_balance = v_balance,
+               credits = credits + v_credit,
+               debits = debits + v_debit,
+               transaction_count = transaction_count + 1;
+       END"""
+]
+
+PROCEDURES_SQL = [
+    "DROP PROCEDURE IF EXISTS Deposit",
+    """CREATE PROCEDURE Deposit(
+        IN p_account_id INT,
+        IN p_amount DECIMAL(15, 2)
+    )
+    BEGIN
+        DECLARE EXIT HANDLER FOR SQLEXCEPTION
+        BEGIN
+            ROLLBACK;
+            RESIGNAL;
+        END;
+
+        START TRANSACTION;
+
+        UPDATE accounts 
+        SET balance = balance + p_amount, version = version + 1
+        WHERE account_id = p_account_id;
+
+        INSERT INTO transactions (account_id, transaction_type, amount, description)
+        VALUES (p_account_id, 'deposit', p_amount, 'Deposit');
+
+        COMMIT;
+    END""",
+
+    "DROP PROCEDURE IF EXISTS Withdraw",
+    """CREATE PROCEDURE Withdraw(
+        IN p_account_id INT,
+        IN p_amount DECIMAL(15, 2),
+        OUT p_success BOOLEAN
+    )
+    BEGIN
+        DECLARE current_bal DECIMAL(15, 2);
+
+        DECLARE EXIT HANDLER FOR SQLEXCEPTION
+        BEGIN
+            ROLLBACK;
+            SET p_success = FALSE;
+            RESIGNAL;
+        END;
+
+        START TRANSACTION;
+
+        SELECT balance INTO current_bal FROM accounts WHERE account_id = p_account_id FOR UPDATE;
+
+        IF current_bal >= p_amount THEN
+            UPDATE accounts 
+            SET balance = balance - p_amount, version = version + 1
+            WHERE account_id = p_account_id;
+
+            INSERT INTO transactions (account_id, transaction_type, amount, description)
+            VALUES (p_account_id, 'withdrawal', p_amount, 'Withdrawal');
+
+            SET p_success = TRUE;
+            COMMIT;
+        ELSE
+            SET p_success = FALSE;
+            ROLLBACK;
+        END IF;
+    END""",
+
+    "DROP PROCEDURE IF EXISTS TransferFunds",
+    """CREATE PROCEDURE TransferFunds(
+        IN p_from_account_id INT,
+        IN p_to_account_id INT,
+        IN p_amount DECIMAL(15, 2),
+        OUT p_success BOOLEAN
+    )
+    BEGIN
+        DECLARE from_bal DECIMAL(15, 2);
+        DECLARE to_id INT;
+
+        DECLARE EXIT HANDLER FOR SQLEXCEPTION
+        BEGIN
+            ROLLBACK;
+            SET p_success = FALSE;
+            RESIGNAL;
+        END;
+
+        START TRANSACTION;
+
+        -- Lock both rows in ascending account_id order, whichever direction the
+        -- money moves, so concurrent A->B and B->A transfers cannot deadlock.
+        IF p_from_account_id < p_to_account_id THEN
+            SELECT balance INTO from_bal FROM accounts WHERE account_id = p_from_account_id FOR UPDATE;
+            SELECT account_id INTO to_id FROM accounts WHERE account_id = p_to_account_id FOR UPDATE;
+        ELSE
+            SELECT account_id INTO to_id FROM accounts WHERE account_id = p_to_account_id FOR UPDATE;
+            SELECT balance INTO from_bal FROM accounts WHERE account_id = p_from_account_id FOR UPDATE;
+        END IF;
+
+        IF from_bal >= p_amount THEN
+            UPDATE accounts 
+            SET balance = balance - p_amount, version = version + 1
+            WHERE account_id = p_from_account_id;
+
+            INSERT INTO transactions (account_id, transaction_type, amount, description)
+            VALUES (p_from_account_id, 'transfer_out', p_amount, CONCAT('Transfer to account ', p_to_account_id));
+
+            UPDATE accounts 
+            SET balance = balance + p_amount, version = version + 1
+            WHERE account_id = p_to_account_id;
+
+            INSERT INTO transactions (account_id, transaction_type, amount, description)
+            VALUES (p_to_account_id, 'transfer_in', p_amount, CONCAT('Transfer from account ', p_from_account_id));
+
+            SET p_success = TRUE;
+            COMMIT;
+        ELSE
+            SET p_success = FALSE;
+            ROLLBACK;
+        END IF;
+    END"""
+]
+
+
 def init_db():
     print("Initializing database...")
     
@@ -37,6 +216,10 @@ def init_db():
     
     tables_sql = [
         "SET FOREIGN_KEY_CHECKS = 0",
+        "DROP TABLE IF EXISTS daily_balances",
+        "DROP TABLE IF EXISTS statement_periods",
+        "DROP TABLE IF EXISTS number_sequences",
+        "DROP TABLE IF EXISTS idempotency_keys",
         "DROP TABLE IF EXISTS transactions",
         "DROP TABLE IF EXISTS accounts",
         "DROP TABLE IF EXISTS users",
@@ -70,7 +253,9 @@ def init_db():
             account_number VARCHAR(20) NOT NULL UNIQUE,
             account_type VARCHAR(20) DEFAULT 'savings',
             balance DECIMAL(15, 2) DEFAULT 0.00,
+            version BIGINT NOT NULL DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX ix_accounts_customer_id (customer_id),
             FOREIGN KEY (customer_id) REFERENCES customers(customer_id) ON DELETE CASCADE
         )""",
         
@@ -81,126 +266,57 @@ def init_db():
             amount DECIMAL(15, 2) NOT NULL,
             description TEXT,
             transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX ix_transactions_account_date (account_id, transaction_date, transaction_id),
+            INDEX ix_transactions_date (transaction_date),
             FOREIGN KEY (account_id) REFERENCES accounts(account_id) ON DELETE CASCADE
-        )"""
-    ]
-
-    triggers_sql = [
-        """CREATE TRIGGER prevent_negative_balance
-           BEFORE UPDATE ON accounts
-           FOR EACH ROW
-           BEGIN
-               IF NEW.balance < 0 THEN
-                   SIGNAL SQLSTATE '45000'
-                   SET MESSAGE_TEXT = 'Insufficient funds: Balance cannot be negative.';
-               END IF;
-           END"""
-    ]
-
-    procedures_sql = [
-        "DROP PROCEDURE IF EXISTS Deposit",
-        """CREATE PROCEDURE Deposit(
-            IN p_account_id INT,
-            IN p_amount DECIMAL(15, 2)
-        )
-        BEGIN
-            DECLARE EXIT HANDLER FOR SQLEXCEPTION
-            BEGIN
-                ROLLBACK;
-                RESIGNAL;
-            END;
-
-            START TRANSACTION;
-
-            UPDATE accounts 
-            SET balance = balance + p_amount 
-            WHERE account_id = p_account_id;
-
-            INSERT INTO transactions (account_id, transaction_type, amount, description)
-            VALUES (p_account_id, 'deposit', p_amount, 'Deposit');
-
-            COMMIT;
-        END""",
-        
-        "DROP PROCEDURE IF EXISTS Withdraw",
-        """CREATE PROCEDURE Withdraw(
-            IN p_account_id INT,
-            IN p_amount DECIMAL(15, 2),
-            OUT p_success BOOLEAN
-        )
-        BEGIN
-            DECLARE current_bal DECIMAL(15, 2);
-            
-            DECLARE EXIT HANDLER FOR SQLEXCEPTION
-            BEGIN
-                ROLLBACK;
-                SET p_success = FALSE;
-                RESIGNAL;
-            END;
-
-            START TRANSACTION;
-
-            SELECT balance INTO current_bal FROM accounts WHERE account_id = p_account_id FOR UPDATE;
-
-            IF current_bal >= p_amount THEN
-                UPDATE accounts 
-                SET balance = balance - p_amount 
-                WHERE account_id = p_account_id;
-
-                INSERT INTO transactions (account_id, transaction_type, amount, description)
-                VALUES (p_account_id, 'withdrawal', p_amount, 'Withdrawal');
-
-                SET p_success = TRUE;
-                COMMIT;
-            ELSE
-                SET p_success = FALSE;
-                ROLLBACK;
-            END IF;
-        END""",
+        )""",
         
-        "DROP PROCEDURE IF EXISTS TransferFunds",
-        """CREATE PROCEDURE TransferFunds(
-            IN p_from_account_id INT,
-            IN p_to_account_id INT,
-            IN p_amount DECIMAL(15, 2),
-            OUT p_success BOOLEAN
-        )
-        BEGIN
-            DECLARE from_bal DECIMAL(15, 2);
-
-            DECLARE EXIT HANDLER FOR SQLEXCEPTION
-            BEGIN
-                ROLLBACK;
-                SET p_success = FALSE;
-                RESIGNAL;
-            END;
-
-            START TRANSACTION;
-
-            SELECT balance INTO from_bal FROM accounts WHERE account_id = p_from_account_id FOR UPDATE;
-
-            IF from_bal >= p_amount THEN
-                UPDATE accounts 
-                SET balance = balance - p_amount 
-                WHERE account_id = p_from_account_id;
+        """CREATE TABLE idempotency_keys (
+            user_id INT NOT NULL,
+            idempotency_key VARCHAR(255) NOT NULL,
+            request_hash CHAR(64) NOT NULL,
+            status_code INT,
+            response_body TEXT,
+            created_at DATETIME NOT NULL,
+            claimed_at DATETIME NOT NULL,
+            executing BOOLEAN NOT NULL DEFAULT FALSE,
+            PRIMARY KEY (user_id, idempotency_key),
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )""",
 
-                INSERT INTO transactions (account_id, transaction_type, amount, description)
-                VALUES (p_from_account_id, 'transfer_out', p_amount, CONCAT('Transfer to account ', p_to_account_id));
+        """CREATE TABLE number_sequences (
+            name VARCHAR(50) PRIMARY KEY,
+            next_value BIGINT NOT NULL
+        )""",
 
-                UPDATE accounts 
-                SET balance = balance + p_amount 
-                WHERE account_id = p_to_account_id;
+        # 15-digit bodies + check digit; can't collide with legacy 12-digit numbers
+        "INSERT INTO number_sequences (name, next_value) VALUES ('account_number', 100000000000000)",
 
-                INSERT INTO transactions (account_id, transaction_type, amount, description)
-                VALUES (p_to_account_id, 'transfer_in', p_amount, CONCAT('Transfer from account ', p_from_account_id));
+        """CREATE TABLE statement_periods (
+            account_id INT NOT NULL,
+            period_start DATE NOT NULL,
+            opening_balance DECIMAL(15, 2) NOT NULL,
+            closing_balance DECIMAL(15, 2) NOT NULL,
+            deposits DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            withdrawals DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            transfers_in DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            transfers_out DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            transaction_count INT NOT NULL DEFAULT 0,
+            closed BOOLEAN NOT NULL DEFAULT FALSE,
+            PRIMARY KEY (account_id, period_start),
+            FOREIGN KEY (account_id) REFERENCES accounts(account_id) ON DELETE CASCADE
+        )""",
 
-                SET p_success = TRUE;
-                COMMIT;
-            ELSE
-                SET p_success = FALSE;
-                ROLLBACK;
-            END IF;
-        END"""
+        """CREATE TABLE daily_balances (
+            account_id INT NOT NULL,
+            day DATE NOT NULL,
+            closing_balance DECIMAL(15, 2) NOT NULL,
+            credits DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            debits DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            transaction_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_id, day),
+            FOREIGN KEY (account_id) REFERENCES accounts(account_id) ON DELETE CASCADE
+        )"""
     ]
 
     try:
@@ -213,14 +329,14 @@ def init_db():
                 conn.commit()
             
             # Execute Triggers
-            for stmt in triggers_sql:
+            for stmt in TRIGGERS_SQL:
                 print(f"Executing Trigger: {stmt[:50]}...")
                 # Triggers often require simple execution without delimiters if strictly one statement in python
                 conn.execute(text(stmt))
                 conn.commit()
             
             # Execute Procedures
-            for stmt in procedures_sql:
+            for stmt in PROCEDURES_SQL:
                 print(f"Executing Procedure: {stmt[:50]}...")
                 conn.execute(text(stmt))
                 conn.commit()
@@ -232,5 +348,237 @@ def init_db():
         import traceback
         traceback.print_exc()
 
+# --- Migrations for existing databases ---
+# init_db() drops and recreates every table. migrate_db() instead brings an
+# existing database up to date in place: each step checks whether it is still
+# needed first, so running it repeatedly is safe.
+
+def _table_exists(conn, table):
+    return conn.execute(
+        text("""SELECT COUNT(*) FROM information_schema.tables
+                WHERE table_schema = DATABASE() AND table_name = :table"""),
+        {"table": table}
+    ).scalar() > 0
+
+def _column_exists(conn, table, column):
+    return conn.execute(
+        text("""SELECT COUNT(*) FROM information_schema.columns
+                WHERE table_schema = DATABASE() AND table_name = :table AND column_name = :column"""),
+        {"table": table, "column": column}
+    ).scalar() > 0
+
+def _index_exists(conn, table, index):
+    return conn.execute(
+        text("""SELECT COUNT(*) FROM information_schema.statistics
+                WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :index"""),
+        {"table": table, "index": index}
+    ).scalar() > 0
+
+def _index_has_descending_column(conn, table, index):
+    return conn.execute(
+        text("""SELECT COUNT(*) FROM information_schema.statistics
+                WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :index
+                AND collation = 'D'"""),
+        {"table": table, "index": index}
+    ).scalar() > 0
+
+MIGRATIONS = [
+    (
+        "Add ix_accounts_customer_id",
+        lambda conn: not _index_exists(conn, "accounts", "ix_accounts_customer_id"),
+        ["CREATE INDEX ix_accounts_customer_id ON accounts (customer_id)"],
+    ),
+    (
+        "Add ix_transactions_account_date",
+        lambda conn: not _index_exists(conn, "transactions", "ix_transactions_account_date"),
+        ["CREATE INDEX ix_transactions_account_date ON transactions (account_id, transaction_date, transaction_id)"],
+    ),
+    # The first version of the index had transaction_date DESC but transaction_id
+    # ascending, matching neither history order. Dropped and re-added in one
+    # statement, since the index also backs the account_id foreign key.
+    (
+        "Recreate ix_transactions_account_date with ascending columns",
+        lambda conn: _index_has_descending_column(conn, "transactions", "ix_transactions_account_date"),
+        ["""ALTER TABLE transactions
+            DROP INDEX ix_transactions_account_date,
+            ADD INDEX ix_transactions_account_date (account_id, transaction_date, transaction_id)"""],
+    ),
+    # MySQL created these implicitly for the foreign keys; the indexes above
+    # start with the same column and now back the constraints instead.
+    (
+        "Drop implicit foreign key index accounts.customer_id",
+        lambda conn: _index_exists(conn, "accounts", "customer_id"),
+        ["DROP INDEX customer_id ON accounts"],
+    ),
+    (
+        "Drop implicit foreign key index transactions.account_id",
+        lambda conn: _index_exists(conn, "transactions", "account_id"),
+        ["DROP INDEX account_id ON transactions"],
+    ),
+    (
+        "Create number_sequences",
+        lambda conn: not _table_exists(conn, "number_sequences"),
+        [
+            """CREATE TABLE number_sequences (
+                name VARCHAR(50) PRIMARY KEY,
+                next_value BIGINT NOT NULL
+            )""",
+            "INSERT INTO number_sequences (name, next_value) VALUES ('account_number', 100000000000000)",
+        ],
+    ),
+    (
+        "Add accounts.version",
+        lambda conn: not _column_exists(conn, "accounts", "version"),
+        ["ALTER TABLE accounts ADD COLUMN version BIGINT NOT NULL DEFAULT 0 AFTER balance"],
+    ),
+    (
+        "Create idempotency_keys",
+        lambda conn: not _table_exists(conn, "idempotency_keys"),
+        ["""CREATE TABLE idempotency_keys (
+        user_id INT NOT NULL,
+        idempotency_key VARCHAR(255) NOT NULL,
+        request_hash CHAR(64) NOT NULL,
+        status_code INT,
+        response_body TEXT,
+        created_at DATETIME NOT NULL,
+        PRIMARY KEY (user_id, idempotency_key),
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    )"""],
+    ),
+    (
+        "Add idempotency_keys.claimed_at",
+        lambda conn: not _column_exists(conn, "idempotency_keys", "claimed_at"),
+        [
+            "ALTER TABLE idempotency_keys ADD COLUMN claimed_at DATETIME NULL AFTER created_at",
+            "UPDATE idempotency_keys SET claimed_at = created_at",
+            "ALTER TABLE idempotency_keys MODIFY claimed_at DATETIME NOT NULL",
+        ],
+    ),
+    # Pending rows from before the column existed may have moved money already,
+    # so they are treated as executing and never taken over.
+    (
+        "Add idempotency_keys.executing",
+        lambda conn: not _column_exists(conn, "idempotency_keys", "executing"),
+        [
+            "ALTER TABLE idempotency_keys ADD COLUMN executing BOOLEAN NOT NULL DEFAULT FALSE AFTER claimed_at",
+            "UPDATE idempotency_keys SET executing = TRUE WHERE status_code IS NULL",
+        ],
+    ),
+    (
+        "Add ix_transactions_date",
+        lambda conn: not _index_exists(conn, "transactions", "ix_transactions_date"),
+        ["CREATE INDEX ix_transactions_date ON transactions (transaction_date)"],
+    ),
+    # The summary tables are created before the triggers are reinstalled below,
+    # since update_ledger_summaries writes to them. Fill them with
+    # statements.py backfill and daily_balances.py backfill.
+    (
+        "Create statement_periods",
+        lambda conn: not _table_exists(conn, "statement_periods"),
+        ["""CREATE TABLE statement_periods (
+            account_id INT NOT NULL,
+            period_start DATE NOT NULL,
+            opening_balance DECIMAL(15, 2) NOT NULL,
+            closing_balance DECIMAL(15, 2) NOT NULL,
+            deposits DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            withdrawals DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            transfers_in DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            transfers_out DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            transaction_count INT NOT NULL DEFAULT 0,
+            closed BOOLEAN NOT NULL DEFAULT FALSE,
+            PRIMARY KEY (account_id, period_start),
+            FOREIGN KEY (account_id) REFERENCES accounts(account_id) ON DELETE CASCADE
+        )"""],
+    ),
+    (
+        "Create daily_balances",
+        lambda conn: not _table_exists(conn, "daily_balances"),
+        ["""CREATE TABLE daily_balances (
+            account_id INT NOT NULL,
+            day DATE NOT NULL,
+            closing_balance DECIMAL(15, 2) NOT NULL,
+            credits DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            debits DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            transaction_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_id, day),
+            FOREIGN KEY (account_id) REFERENCES accounts(account_id) ON DELETE CASCADE
+        )"""],
+    ),
+]
+
+def migrate_db():
+    print("Migrating database...")
+    with engine.connect() as conn:
+        for description, needed, statements in MIGRATIONS:
+            if not needed(conn):
+                print(f"Skipping (already applied): {description}")
+                continue
+            print(f"Applying: {description}")
+            for stmt in statements:
+                conn.execute(text(stmt))
+                conn.commit()
+
+        print("Reinstalling triggers and stored procedures...")
+        for stmt in TRIGGERS_SQL + PROCEDURES_SQL:
+            conn.execute(text(stmt))
+            conn.commit()
+    print("Database migrated successfully!")
+
+# --- Query plan checks ---
+# The hot queries and the index each one must use. `--explain` fails (exit code 1)
+# if MySQL would not use the index, or would need a filesort for the query's order.
+HOT_QUERIES = [
+    (
+        "Transaction history page",
+        """SELECT * FROM transactions WHERE account_id = :id
+           ORDER BY transaction_date DESC, transaction_id DESC LIMIT 21""",
+        "ix_transactions_account_date",
+    ),
+    (
+        "Transaction history page (newer)",
+        """SELECT * FROM transactions WHERE account_id = :id
+           ORDER BY transaction_date ASC, transaction_id ASC LIMIT 21""",
+        "ix_transactions_account_date",
+    ),
+    (
+        "Accounts for customer",
+        "SELECT * FROM accounts WHERE customer_id = :id",
+        "ix_accounts_customer_id",
+    ),
+    (
+        "Balance on a date",
+        "SELECT * FROM daily_balances WHERE account_id = :id AND day <= CURRENT_DATE ORDER BY day DESC LIMIT 1",
+        "PRIMARY",
+    ),
+    (
+        "Monthly statements",
+        "SELECT * FROM statement_periods WHERE account_id = :id ORDER BY period_start DESC",
+        "PRIMARY",
+    ),
+]
+
+def explain_hot_queries():
+    ok = True
+    with engine.connect() as conn:
+        for description, sql, expected_index in HOT_QUERIES:
+            plan = conn.execute(text(f"EXPLAIN {sql}"), {"id": 1}).mappings().first()
+            extra = plan.get("Extra") or ""
+            passed = plan["key"] == expected_index and "filesort" not in extra
+            ok = ok and passed
+            print(f"[{'OK' if passed else 'FAIL'}] {description}: key={plan['key']} rows={plan['rows']} extra={extra}")
+    return ok
+
 if __name__ == "__main__":
-    init_db()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create, migrate or check the banking database.")
+    parser.add_argument("--migrate", action="store_true", help="Upgrade an existing database in place instead of recreating it")
+    parser.add_argument("--explain", action="store_true", help="Check that the hot queries use their indexes")
+    args = parser.parse_args()
+
+    if args.migrate:
+        migrate_db()
+    elif args.explain:
+        sys.exit(0 if explain_hot_queries() else 1)
+    else:
+        init_db()
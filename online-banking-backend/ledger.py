@@ -0,0 +1,220 @@
+import asyncio
+import random
+
+from fastapi import HTTPException, status
+from sqlalchemy import case, insert, or_, text, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models, metrics, balance_cache, account_events
+from config import settings
+
+# Balance mutations. The routers validate ownership and handle commits/errors;
+# these helpers only run the statements and report whether funds were moved.
+#
+# Two execution paths are available, selected by settings.LEDGER_EXECUTION:
+#
+# "procedure" - the `Deposit`/`Withdraw`/`TransferFunds` stored procedures. Each
+#               procedure manages its own transaction (START TRANSACTION ... COMMIT),
+#               so the call is committed as soon as it returns, and the outcome has
+#               to be read back with a second `SELECT @success` round trip.
+#
+# "direct"    - guarded UPDATE statements whose affected-row count is the outcome,
+#               followed by one INSERT for all ledger rows: two statements for any
+#               operation, one of them only when funds were moved. No SELECT ... FOR
+#               UPDATE, no session variables. Runs inside the caller's transaction: the
+#               caller commits on success; on failure the helper has already rolled back.
+#
+#               MySQL can't change two tables in one statement, so the debit and the
+#               ledger row stay separate statements. Folding them into one (an
+#               INSERT ... SELECT guarded on the balance, with a trigger applying the
+#               debit) would apply procedure-path debits twice.
+
+accounts_table = models.Account.__table__
+transactions_table = models.Transaction.__table__
+
+# --- Stored procedure path ---
+
+async def deposit_via_procedure(db: AsyncSession, account_id: int, amount: float) -> bool:
+    """Credits an account through the `Deposit` procedure. Deposits always succeed."""
+    await db.execute(
+        text("CALL Deposit(:account_id, :amount)"),
+        {"account_id": account_id, "amount": amount}
+    )
+    return True
+
+async def withdraw_via_procedure(db: AsyncSession, account_id: int, amount: float) -> bool:
+    """Debits an account through the `Withdraw` procedure. False means insufficient funds."""
+    # The stored procedure has an OUT parameter `success`
+    await db.execute(
+        text("CALL Withdraw(:account_id, :amount, @success)"),
+        {"account_id": account_id, "amount": amount}
+    )
+    # Fetch the value of the OUT parameter
+    success_row = (await db.execute(text("SELECT @success"))).fetchone()
+    return bool(success_row and success_row[0] == 1)
+
+async def transfer_via_procedure(db: AsyncSession, from_account_id: int, to_account_id: int, amount: float) -> bool:
+    """Moves funds through the `TransferFunds` procedure. False means insufficient funds."""
+    await db.execute(
+        text("CALL TransferFunds(:from_id, :to_id, :amount, @success)"),
+        {"from_id": from_account_id, "to_id": to_account_id, "amount": amount}
+    )
+    success_row = (await db.execute(text("SELECT @success"))).fetchone()
+    return bool(success_row and success_row[0] == 1)
+
+# --- Direct (guarded UPDATE) path ---
+
+async def _record(db: AsyncSession, entries: list):
+    """Writes ledger rows with a single multi-row INSERT."""
+    await db.execute(insert(transactions_table).values(entries))
+
+async def deposit_direct(db: AsyncSession, account_id: int, amount: float) -> bool:
+    """Credits an account: one UPDATE plus the ledger INSERT. False if the account does not exist."""
+    result = await db.execute(
+        update(accounts_table)
+        .where(accounts_table.c.account_id == account_id)
+        .values(balance=accounts_table.c.balance + amount, version=accounts_table.c.version + 1)
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        return False
+    await _record(db, [
+        {"account_id": account_id, "transaction_type": "deposit", "amount": amount, "description": "Deposit"},
+    ])
+    return True
+
+async def withdraw_direct(db: AsyncSession, account_id: int, amount: float) -> bool:
+    """
+    Debits an account only if it holds enough funds. The balance check and the
+    debit are the same statement, so there is no read-then-write race to lock against.
+    """
+    result = await db.execute(
+        update(accounts_table)
+        .where(accounts_table.c.account_id == account_id, accounts_table.c.balance >= amount)
+        .values(balance=accounts_table.c.balance - amount, version=accounts_table.c.version + 1)
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        return False
+    await _record(db, [
+        {"account_id": account_id, "transaction_type": "withdrawal", "amount": amount, "description": "Withdrawal"},
+    ])
+    return True
+
+async def transfer_direct(db: AsyncSession, from_account_id: int, to_account_id: int, amount: float) -> bool:
+    """
+    Debits the source and credits the destination in one UPDATE. The source row
+    only matches if it holds enough funds, so anything other than two affected rows
+    means the transfer must not happen and is rolled back.
+
+    Both rows are located through the primary key with `account_id IN (...)`, which
+    InnoDB scans, and therefore locks, in ascending account_id order regardless of
+    transfer direction. Concurrent A->B and B->A transfers queue on the same first
+    row instead of deadlocking.
+    """
+    result = await db.execute(
+        update(accounts_table)
+        .where(
+            accounts_table.c.account_id.in_([from_account_id, to_account_id]),
+            or_(accounts_table.c.account_id == to_account_id, accounts_table.c.balance >= amount),
+        )
+        .values(
+            balance=case(
+                (accounts_table.c.account_id == from_account_id, accounts_table.c.balance - amount),
+                else_=accounts_table.c.balance + amount,
+            ),
+            version=accounts_table.c.version + 1,
+        )
+    )
+    if result.rowcount != 2:
+        await db.rollback()
+        return False
+    await _record(db, [
+        {"account_id": from_account_id, "transaction_type": "transfer_out", "amount": amount,
+         "description": f"Transfer to account {to_account_id}"},
+        {"account_id": to_account_id, "transaction_type": "transfer_in", "amount": amount,
+         "description": f"Transfer from account {from_account_id}"},
+    ])
+    return True
+
+# --- Lock conflict retries ---
+# MySQL error codes for a deadlock victim and for giving up on a row lock.
+# In both cases the statement had no effect and the transaction can be re-run.
+ER_LOCK_DEADLOCK = 1213
+ER_LOCK_WAIT_TIMEOUT = 1205
+
+def is_lock_conflict(error: Exception) -> bool:
+    if not isinstance(error, DBAPIError) or error.orig is None:
+        return False
+    # mysql-connector exposes `errno`; aiomysql/pymysql put the code in args[0]
+    code = getattr(error.orig, "errno", None)
+    if code is None and error.orig.args:
+        code = error.orig.args[0]
+    return code in (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT)
+
+async def retry_on_lock_conflict(db: AsyncSession, operation):
+    """
+    Runs `operation` (an async callable issuing the transaction's statements) and
+    re-runs it from a clean transaction when it loses a deadlock or times out
+    waiting for a row lock. Waits between attempts grow exponentially with full
+    jitter. Once LOCK_RETRY_ATTEMPTS retries are used up the request fails with 503.
+    """
+    attempt = 0
+    while True:
+        try:
+            result = await operation()
+            if attempt:
+                metrics.increment("ledger.lock_retry_successes")
+            return result
+        except DBAPIError as e:
+            if not is_lock_conflict(e):
+                raise
+            await db.rollback()
+            metrics.increment("ledger.lock_conflicts")
+            if attempt >= settings.LOCK_RETRY_ATTEMPTS:
+                metrics.increment("ledger.lock_retries_exhausted")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="The account is busy. Please try again."
+                )
+            ceiling = min(settings.LOCK_RETRY_MAX_DELAY_MS, settings.LOCK_RETRY_BASE_DELAY_MS * 2 ** attempt)
+            await asyncio.sleep(random.uniform(0, ceiling) / 1000)
+            attempt += 1
+            metrics.increment("ledger.lock_retries")
+
+# --- Public API (dispatches on settings.LEDGER_EXECUTION) ---
+
+def uses_direct_path() -> bool:
+    return settings.LEDGER_EXECUTION == "direct"
+
+async def deposit(db: AsyncSession, account_id: int, amount: float) -> bool:
+    balance_cache.touch(db, account_id)
+    if uses_direct_path():
+        success = await deposit_direct(db, account_id, amount)
+    else:
+        success = await deposit_via_procedure(db, account_id, amount)
+    if success:
+        account_events.record(db, account_id, "deposit", amount, "Deposit")
+    return success
+
+async def withdraw(db: AsyncSession, account_id: int, amount: float) -> bool:
+    balance_cache.touch(db, account_id)
+    if uses_direct_path():
+        success = await withdraw_direct(db, account_id, amount)
+    else:
+        success = await withdraw_via_procedure(db, account_id, amount)
+    if success:
+        account_events.record(db, account_id, "withdrawal", amount, "Withdrawal")
+    return success
+
+async def transfer(db: AsyncSession, from_account_id: int, to_account_id: int, amount: float) -> bool:
+    balance_cache.touch(db, from_account_id, to_account_id)
+    if uses_direct_path():
+        success = await transfer_direct(db, from_account_id, to_account_id, amount)
+    else:
+        success = await transfer_via_procedure(db, from_account_id, to_account_id, amount)
+    if success:
+        account_events.record(db, from_account_id, "transfer_out", amount, f"Transfer to account {to_account_id}")
+        account_events.record(db, to_account_id, "transfer_in", amount, f"Transfer from account {from_account_id}")
+    return success
@@ -1,20 +1,33 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from database import engine
-import models
-from routers import auth, accounts, transactions
+from database import engine, WriteMarkerMiddleware
+import models, passwords, write_behind
+from routers import auth, accounts, transactions, admin, dashboard, events
 from config import settings
 
 # This line is not strictly necessary if you are not using Alembic or creating tables from scratch,
 # but it's good practice to have it. It registers your models with the SQLAlchemy engine.
 models.Base.metadata.create_all(bind=engine) # Uncomment if you need to create tables
 
+# --- Application Lifespan ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the password hashing workers before the first login arrives
+    passwords.start()
+    write_behind.start()
+    yield
+    await write_behind.shutdown()
+    passwords.shutdown()
+
 # --- FastAPI App Initialization ---
 app = FastAPI(
     title="Online Banking API",
     description="A secure API for a student's online banking project.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # --- CORS (Cross-Origin Resource Sharing) Middleware ---
@@ -27,11 +40,18 @@ app.add_middleware(
     allow_headers=["*"],     # Allows all headers
 )
 
+# --- Read-your-writes Middleware ---
+# Sets the signed cookie that keeps a user's reads on the primary right after they write
+app.add_middleware(WriteMarkerMiddleware)
+
 # --- API Routers ---
 # Include the routers from the different modules.
 app.include_router(auth.router)
 app.include_router(accounts.router)
 app.include_router(transactions.router)
+app.include_router(admin.router)
+app.include_router(dashboard.router)
+app.include_router(events.router)
 
 # --- Root Endpoint ---
 @app.get("/", tags=["Root"])
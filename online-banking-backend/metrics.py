@@ -0,0 +1,20 @@
+import threading
+from collections import defaultdict
+
+# In-process counters reported by GET /admin/metrics.
+# Names are dotted "<area>.<event>" strings, e.g. "ledger.lock_retries".
+
+_counters = defaultdict(int)
+_lock = threading.Lock()
+
+def increment(name: str, amount: int = 1):
+    with _lock:
+        _counters[name] += amount
+
+def get(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+def snapshot() -> dict:
+    with _lock:
+        return dict(sorted(_counters.items()))
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import BigInteger, Boolean, Column, Date, Integer, String, Float, DateTime, ForeignKey, Text, Index
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
+from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.sql import func
 from database import Base
 
@@ -33,6 +35,11 @@ class User(Base):
 
     customer = relationship("Customer", back_populates="user")
 
+    # Profile fields live on the customer; expose them so schemas.User can read them directly
+    email = association_proxy("customer", "email")
+    first_name = association_proxy("customer", "first_name")
+    last_name = association_proxy("customer", "last_name")
+
 class Account(Base):
     __tablename__ = "accounts"
 
@@ -41,11 +48,18 @@ class Account(Base):
     account_number = Column(String(20), unique=True, nullable=False)
     account_type = Column(String(20), nullable=False, default='savings')
     balance = Column(Float, nullable=False, default=0.0)
+    # Incremented by every balance change; ETags for account and history responses derive from it
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, server_default=func.now())
 
     owner = relationship("Customer", back_populates="accounts")
     transactions = relationship("Transaction", back_populates="account")
 
+    __table_args__ = (
+        # GET /accounts/ lists accounts by owner
+        Index("ix_accounts_customer_id", customer_id),
+    )
+
 class Transaction(Base):
     __tablename__ = "transactions"
 
@@ -54,6 +68,68 @@ class Transaction(Base):
     transaction_type = Column(String(20), nullable=False) # e.g., 'deposit', 'withdrawal', 'transfer'
     amount = Column(Float, nullable=False)
     description = Column(Text)
-    transaction_date = Column(DateTime, server_default=func.now())
+    # SQLite stores CURRENT_TIMESTAMP as 'YYYY-MM-DD HH:MM:SS' text. Bound values
+    # (inserts, pagination cursors, date filters) use the same format there, so
+    # text comparisons agree with date order; MySQL's TIMESTAMP has whole seconds too.
+    transaction_date = Column(
+        DateTime().with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite"),
+        server_default=func.now(),
+    )
 
     account = relationship("Account", back_populates="transactions")
+
+    __table_args__ = (
+        # Transaction history: equality on account_id, then the keyset sort key.
+        # Both columns ascend, so newest-first pages (date DESC, id DESC) scan the
+        # index backwards and older-first pages (date ASC, id ASC) forwards;
+        # neither needs a sort
+        Index("ix_transactions_account_date", account_id, transaction_date, transaction_id),
+        # Period jobs (statements.py) read one date range across all accounts
+        Index("ix_transactions_date", transaction_date),
+    )
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # Keys are scoped per user, so two clients can't collide on the same key
+    user_id = Column(Integer, ForeignKey("users.user_id"), primary_key=True)
+    idempotency_key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)  # endpoint + body; a reused key must match
+    status_code = Column(Integer)  # NULL while the first request is still running
+    response_body = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    claimed_at = Column(DateTime, nullable=False)  # When the running request took the key; a stale claim can be taken over
+    executing = Column(Boolean, nullable=False, default=False, server_default="0")  # Set before the operation runs; never taken over
+
+class NumberSequence(Base):
+    __tablename__ = "number_sequences"
+
+    # Named counters handed out in blocks (see account_numbers.py)
+    name = Column(String(50), primary_key=True)
+    next_value = Column(BigInteger, nullable=False)
+
+class StatementPeriod(Base):
+    __tablename__ = "statement_periods"
+
+    # One row per account and month with activity (see statements.py)
+    account_id = Column(Integer, ForeignKey("accounts.account_id"), primary_key=True)
+    period_start = Column(Date, primary_key=True)  # First day of the month
+    opening_balance = Column(Float, nullable=False)
+    closing_balance = Column(Float, nullable=False)
+    deposits = Column(Float, nullable=False, default=0.0)
+    withdrawals = Column(Float, nullable=False, default=0.0)
+    transfers_in = Column(Float, nullable=False, default=0.0)
+    transfers_out = Column(Float, nullable=False, default=0.0)
+    transaction_count = Column(Integer, nullable=False, default=0)
+    closed = Column(Boolean, nullable=False, default=False)  # Set by the month-end closing job
+
+class DailyBalance(Base):
+    __tablename__ = "daily_balances"
+
+    # One row per account and day with activity (see daily_balances.py)
+    account_id = Column(Integer, ForeignKey("accounts.account_id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    closing_balance = Column(Float, nullable=False)
+    credits = Column(Float, nullable=False, default=0.0)
+    debits = Column(Float, nullable=False, default=0.0)
+    transaction_count = Column(Integer, nullable=False, default=0)
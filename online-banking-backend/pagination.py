@@ -0,0 +1,90 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+
+# Keyset (cursor) pagination over (transaction_date, transaction_id).
+#
+# Instead of OFFSET, each page filters on the sort key of the row it continues
+# from, so the database seeks straight to the page through the
+# (account_id, transaction_date, transaction_id) index and page N costs the same
+# as page 1. Cursors are opaque to clients: URL-safe base64 of a small JSON
+# document holding the direction and the boundary row's sort key. On SQLite the
+# boundary date is bound in the stored text format (see Transaction.transaction_date),
+# so equal timestamps compare equal.
+
+NEXT = "next"   # towards older transactions
+PREV = "prev"   # towards newer transactions
+
+
+def encode_cursor(direction: str, transaction_date: datetime, transaction_id: int) -> str:
+    raw = json.dumps({"d": direction, "t": transaction_date.isoformat(), "i": transaction_id})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Returns (direction, transaction_date, transaction_id); raises a 400 for malformed cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = data["d"]
+        if direction not in (NEXT, PREV):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(data["t"]), int(data["i"])
+    except (ValueError, KeyError, TypeError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+
+
+def keyset_page(stmt, date_column, id_column, limit: int, cursor: str = None):
+    """
+    Applies keyset filtering, ordering and limit to `stmt` (newest first).
+    Returns (statement, direction). The statement fetches one extra row so the
+    caller can tell whether another page exists; pass its rows to page_cursors().
+    """
+    direction = NEXT
+    if cursor:
+        direction, boundary_date, boundary_id = decode_cursor(cursor)
+        # Expanded row comparison; MySQL uses the index range for this form
+        if direction == NEXT:
+            stmt = stmt.where(or_(
+                date_column < boundary_date,
+                and_(date_column == boundary_date, id_column < boundary_id),
+            ))
+        else:
+            stmt = stmt.where(or_(
+                date_column > boundary_date,
+                and_(date_column == boundary_date, id_column > boundary_id),
+            ))
+
+    if direction == NEXT:
+        stmt = stmt.order_by(date_column.desc(), id_column.desc())
+    else:
+        # Walk backwards towards newer rows, then flip the page in page_cursors()
+        stmt = stmt.order_by(date_column.asc(), id_column.asc())
+    return stmt.limit(limit + 1), direction
+
+
+def page_cursors(rows: list, limit: int, direction: str, had_cursor: bool):
+    """
+    Trims the look-ahead row and builds the cursors for the surrounding pages.
+    Returns (rows newest first, next_cursor, prev_cursor).
+    """
+    has_more = len(rows) > limit
+    rows = list(rows[:limit])
+    if direction == PREV:
+        rows.reverse()
+    if not rows:
+        return rows, None, None
+
+    first, last = rows[0], rows[-1]
+    if direction == NEXT:
+        older_exist, newer_exist = has_more, had_cursor
+    else:
+        older_exist, newer_exist = True, has_more
+
+    next_cursor = encode_cursor(NEXT, last.transaction_date, last.transaction_id) if older_exist else None
+    prev_cursor = encode_cursor(PREV, first.transaction_date, first.transaction_id) if newer_exist else None
+    return rows, next_cursor, prev_cursor
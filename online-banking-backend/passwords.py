@@ -0,0 +1,235 @@
+import asyncio
+import multiprocessing
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from passlib.context import CryptContext
+from sqlalchemy import update
+
+import database, dependencies, metrics, models
+from config import settings
+
+# --- Hashing Policy ---
+# New hashes use the calibrated (or configured) cost. Stored hashes whose cost
+# falls outside [BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS] are rehashed on login.
+
+def _build_context(rounds: int) -> CryptContext:
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=settings.BCRYPT_MIN_ROUNDS,
+        bcrypt__max_rounds=settings.BCRYPT_MAX_ROUNDS,
+    )
+
+# Password hashing setup; replaced by configure() once the cost is known
+pwd_context = _build_context(settings.BCRYPT_ROUNDS or settings.BCRYPT_MIN_ROUNDS)
+
+# Result of the last calibration (exposed via /admin/password-hashing)
+calibration = None
+
+def calibrate() -> dict:
+    """
+    Picks the highest bcrypt cost within policy whose hash time fits the
+    BCRYPT_TARGET_MS budget on this machine. Each extra round doubles the cost,
+    so hashes are timed at BCRYPT_MIN_ROUNDS and the rest is extrapolated.
+    """
+    probe = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=settings.BCRYPT_MIN_ROUNDS)
+    samples = []
+    for _ in range(3):
+        start = time.perf_counter()
+        probe.hash("calibration-probe")
+        samples.append(time.perf_counter() - start)
+    base_ms = statistics.median(samples) * 1000
+
+    rounds = settings.BCRYPT_MIN_ROUNDS
+    while rounds < settings.BCRYPT_MAX_ROUNDS and base_ms * 2 ** (rounds + 1 - settings.BCRYPT_MIN_ROUNDS) <= settings.BCRYPT_TARGET_MS:
+        rounds += 1
+
+    return {
+        "rounds": rounds,
+        "source": "calibrated",
+        "estimated_hash_ms": base_ms * 2 ** (rounds - settings.BCRYPT_MIN_ROUNDS),
+        "target_ms": settings.BCRYPT_TARGET_MS,
+        "min_rounds": settings.BCRYPT_MIN_ROUNDS,
+        "max_rounds": settings.BCRYPT_MAX_ROUNDS,
+        "calibrated_at": datetime.utcnow(),
+    }
+
+def configure():
+    """Calibrates once per process, unless BCRYPT_ROUNDS pins the cost."""
+    global pwd_context, calibration
+    if calibration is not None:
+        return
+    if settings.BCRYPT_ROUNDS is not None:
+        calibration = {
+            "rounds": settings.BCRYPT_ROUNDS,
+            "source": "configured",
+            "estimated_hash_ms": None,
+            "target_ms": settings.BCRYPT_TARGET_MS,
+            "min_rounds": settings.BCRYPT_MIN_ROUNDS,
+            "max_rounds": settings.BCRYPT_MAX_ROUNDS,
+            "calibrated_at": None,
+        }
+    else:
+        calibration = calibrate()
+    pwd_context = _build_context(calibration["rounds"])
+
+# --- Worker-side functions ---
+# These run inside the pool's worker processes, so they must be importable
+# module-level functions.
+
+def _init_worker(rounds: int):
+    global pwd_context
+    # Workers use the cost calibrated in the parent, so every process agrees
+    pwd_context = _build_context(rounds)
+    # Lower the workers' CPU priority so that, on a busy host, request handling
+    # in the main process wins over queued hashing work.
+    if hasattr(os, "nice"):
+        os.nice(settings.PASSWORD_WORKER_NICE)
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify(password: str, password_hash: str) -> bool:
+    return pwd_context.verify(password, password_hash)
+
+# --- Process Pool ---
+# bcrypt is deliberately slow CPU work. Running it in separate processes keeps
+# it from holding threadpool slots and the GIL that every other request needs.
+# Set PASSWORD_POOL_WORKERS=0 to fall back to the threadpool (e.g. for scripts).
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = 0  # Only touched on the event loop thread
+
+def start():
+    """
+    Calibrates the hashing cost and starts the worker processes. Called from the
+    app lifespan; otherwise done on first use.
+    """
+    global _executor
+    with _executor_lock:
+        configure()
+        if _executor is None and settings.PASSWORD_POOL_WORKERS > 0:
+            # "spawn" gives clean workers: forked ones would inherit the server's
+            # listening socket and signal handlers and outlive a shutdown.
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(calibration["rounds"],),
+            )
+    return _executor
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+async def _run(func, *args):
+    """
+    Runs a hashing function in the pool.
+    - At most PASSWORD_POOL_WORKERS + PASSWORD_QUEUE_SIZE calls may be in flight;
+      beyond that the request is rejected with 503 instead of queueing unboundedly.
+    - A call that takes longer than PASSWORD_TIMEOUT_SECONDS (including time spent
+      queued) is answered with 503. It still counts as in flight until the pool
+      has finished or dropped it.
+    """
+    global _in_flight
+    executor = start()
+    if executor is None:
+        return await run_in_threadpool(func, *args)
+
+    if _in_flight >= settings.PASSWORD_POOL_WORKERS + settings.PASSWORD_QUEUE_SIZE:
+        metrics.increment("passwords.rejected")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests. Please try again shortly.",
+            headers={"Retry-After": "1"},
+        )
+
+    loop = asyncio.get_running_loop()
+    job = executor.submit(func, *args)
+    _in_flight += 1
+    # Released when the job itself ends, not when we stop waiting for it: a timed
+    # out hash keeps its worker busy until it finishes
+    job.add_done_callback(lambda _: loop.call_soon_threadsafe(_job_finished))
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(job), timeout=settings.PASSWORD_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        metrics.increment("passwords.timeouts")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication timed out. Please try again shortly.",
+            headers={"Retry-After": "1"},
+        )
+
+def _job_finished():
+    global _in_flight
+    _in_flight -= 1
+
+# --- Public API ---
+
+async def hash_password(password: str) -> str:
+    """Hashes a password in the worker pool."""
+    return await _run(_hash, password)
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    """Checks a password against its hash in the worker pool."""
+    return await _run(_verify, password, password_hash)
+
+async def hash_many(plain_passwords: list) -> list:
+    """
+    Hashes many passwords in parallel for bulk jobs (see bulk_import.py), with
+    no timeout and outside the in-flight limit.
+    - A job runs at most PASSWORD_POOL_WORKERS - 1 hashes at once, leaving one
+      worker free for logins. With a single worker the job takes turns with
+      them, so a login waits for at most one bulk hash.
+    - The cap is per job: concurrent imports can still occupy every worker.
+    """
+    executor = start()
+    semaphore = asyncio.Semaphore(max(settings.PASSWORD_POOL_WORKERS - 1, 1))
+    loop = asyncio.get_running_loop()
+
+    async def hash_one(password):
+        async with semaphore:
+            if executor is None:
+                return await run_in_threadpool(_hash, password)
+            return await loop.run_in_executor(executor, _hash, password)
+
+    return await asyncio.gather(*[hash_one(password) for password in plain_passwords])
+
+def needs_rehash(password_hash: str) -> bool:
+    """True if a stored hash's cost is outside the current policy. Cheap; no hashing."""
+    return pwd_context.needs_update(password_hash)
+
+async def rehash_password(user_id: int, username: str, old_hash: str, password: str):
+    """
+    Replaces a stored hash with one at the current cost. Meant to run as a
+    background task after a successful login, off the response path.
+    - The UPDATE only applies if the stored hash is still `old_hash`, so a
+      password change that happened meanwhile is never overwritten.
+    - Failures are counted and otherwise ignored; the next login retries.
+    """
+    try:
+        new_hash = await hash_password(password)
+        async with database.AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.User)
+                .where(models.User.user_id == user_id, models.User.password_hash == old_hash)
+                .values(password_hash=new_hash)
+            )
+            await db.commit()
+        dependencies.invalidate_principal(username)
+        metrics.increment("passwords.rehashed")
+    except Exception:
+        metrics.increment("passwords.rehash_failures")
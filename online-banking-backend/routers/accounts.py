@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from datetime import date, timedelta
 
-import database, schemas, models, dependencies
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+import schemas, models, dependencies, database, balance_cache, etags, daily_balances
 
 router = APIRouter(
     prefix="/accounts",
@@ -11,15 +14,30 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[schemas.Account])
-def get_user_accounts(
-    db: Session = Depends(database.get_db), 
+async def get_user_accounts(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(dependencies.get_read_db), 
     current_user: models.User = Depends(dependencies.get_current_active_user)
 ):
     """
     Retrieves all bank accounts associated with the currently authenticated user.
     The dependency `get_current_active_user` ensures this endpoint is protected.
+    - The ETag covers every account's id and version; a matching If-None-Match
+      gets a 304 without loading the accounts.
     """
-    accounts = db.query(models.Account).filter(models.Account.customer_id == current_user.customer_id).all()
+    versions = await db.execute(
+        select(models.Account.account_id, models.Account.version)
+        .where(models.Account.customer_id == current_user.customer_id)
+        .order_by(models.Account.account_id)
+    )
+    etag = etags.make_etag("accounts", etags.version_digest(versions))
+    if etags.matches(request, etag):
+        return etags.not_modified(etag)
+    etags.tag(response, etag)
+
+    result = await db.execute(select(models.Account).where(models.Account.customer_id == current_user.customer_id))
+    accounts = result.scalars().all()
     
     if not accounts:
         # It's not an error to have no accounts, just return an empty list.
@@ -28,22 +46,119 @@ def get_user_accounts(
     return accounts
 
 @router.get("/{account_id}/balance", response_model=schemas.AccountBase)
-def get_account_balance(
+async def get_account_balance(
     account_id: int,
-    db: Session = Depends(database.get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(dependencies.get_read_db),
     current_user: models.User = Depends(dependencies.get_current_active_user)
 ):
     """
     Retrieves the details and balance for a specific account.
     - Ensures the user owns the account before returning data.
+    - Served from `balance_cache` when possible; balance changes in this worker
+      invalidate it, other workers' show up within BALANCE_CACHE_TTL_SECONDS.
+    - Tagged with the account's version; a matching If-None-Match gets a 304.
     """
-    account = db.query(models.Account).filter(models.Account.account_id == account_id).first()
+    account = balance_cache.get(account_id)
+    if account is None:
+        stamp = balance_cache.write_stamp(account_id)
+        row = await db.get(models.Account, account_id)
+        if row:
+            account = {
+                "account_id": row.account_id,
+                "account_number": row.account_number,
+                "account_type": row.account_type,
+                "balance": row.balance,
+                "customer_id": row.customer_id,
+                "version": row.version,
+            }
+            from_replica = bool(db.info.get("read_only") and database.replica_engines)
+            balance_cache.store(account_id, account, stamp, from_replica=from_replica)
 
     # Security Check: Ensure the account exists and belongs to the current user
     if not account:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
     
-    if account.customer_id != current_user.customer_id:
+    if account["customer_id"] != current_user.customer_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this account")
 
+    etag = etags.make_etag("account", account_id, account["version"])
+    if etags.matches(request, etag):
+        return etags.not_modified(etag)
+    etags.tag(response, etag)
     return account
+
+@router.get("/{account_id}/statements", response_model=List[schemas.StatementPeriod])
+async def get_account_statements(
+    account_id: int,
+    date_from: Optional[date] = Query(None, alias="from", description="First month included (any day of it)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last month included (any day of it)"),
+    db: AsyncSession = Depends(dependencies.get_read_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
+    """
+    Monthly statements for an account, newest first: opening and closing balance,
+    totals per transaction type and the number of transactions.
+    - Read from the precomputed statement_periods rows (see `statements`), one per month.
+    - Months without transactions have no statement; the balance carried over
+      is the closing balance of the statement before.
+    - `closed` is false for the current month, which is still changing.
+    """
+    account = await db.get(models.Account, account_id)
+    if not account:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+    if account.customer_id != current_user.customer_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this account")
+
+    stmt = select(models.StatementPeriod).where(models.StatementPeriod.account_id == account_id)
+    if date_from is not None:
+        stmt = stmt.where(models.StatementPeriod.period_start >= date_from.replace(day=1))
+    if date_to is not None:
+        stmt = stmt.where(models.StatementPeriod.period_start <= date_to)
+    result = await db.execute(stmt.order_by(models.StatementPeriod.period_start.desc()))
+    return result.scalars().all()
+
+@router.get("/{account_id}/balance-history", response_model=schemas.BalanceHistory)
+async def get_balance_history(
+    account_id: int,
+    date_from: Optional[date] = Query(None, alias="from", description="First day included (default: 29 days before `to`)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last day included (default: today)"),
+    db: AsyncSession = Depends(dependencies.get_read_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
+    """
+    Daily balances for an account over a date range, for charts and "balance on
+    date X" lookups.
+    - Read from the precomputed daily_balances rows (see `daily_balances`):
+      a primary key range plus one lookup for the opening balance.
+    - `days` only lists days with transactions; in between, the previous
+      day's closing balance carries over, starting from `opening_balance`.
+    """
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=29)
+    if date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="`from` must not be after `to`.")
+
+    account = await db.get(models.Account, account_id)
+    if not account:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+    if account.customer_id != current_user.customer_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this account")
+
+    result = await db.execute(
+        select(models.DailyBalance)
+        .where(
+            models.DailyBalance.account_id == account_id,
+            models.DailyBalance.day >= date_from,
+            models.DailyBalance.day <= date_to,
+        )
+        .order_by(models.DailyBalance.day)
+    )
+    days = result.scalars().all()
+
+    opening_balance = await daily_balances.balance_on(db, account_id, date_from - timedelta(days=1))
+    if opening_balance is None:
+        # No daily rows yet (no transactions, or not backfilled)
+        opening_balance = account.balance
+    return {"account_id": account_id, "opening_balance": opening_balance, "days": days}
@@ -0,0 +1,84 @@
+import os
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, List
+
+import schemas, dependencies, db_pool, metrics, passwords, bulk_import, account_events
+from config import settings
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(dependencies.get_current_admin_user)]
+)
+
+@router.get("/pool", response_model=List[schemas.PoolStatus])
+async def get_pool_status():
+    """
+    Reports connection pool usage for each database engine.
+    - Checked-out and overflow connections show how close the pool is to its limit.
+    - Checkout wait times and timeouts show whether requests are queueing for a connection.
+    """
+    return db_pool.pool_status()
+
+@router.get("/metrics", response_model=Dict[str, int])
+async def get_metrics():
+    """
+    In-process counters, e.g. lock conflict retries on balance changes
+    (`ledger.lock_conflicts`, `ledger.lock_retries`, `ledger.lock_retries_exhausted`),
+    plus the number of open event streams (`events.subscribers`).
+    """
+    return {**metrics.snapshot(), "events.subscribers": account_events.subscriber_count()}
+
+@router.get("/password-hashing", response_model=schemas.PasswordHashingStatus)
+async def get_password_hashing():
+    """
+    Reports the bcrypt cost this process hashes with and how it was chosen.
+    Stored hashes outside [min_rounds, max_rounds] are rehashed on the next login.
+    """
+    # The first call may calibrate, which hashes for a while; keep it off the event loop
+    await run_in_threadpool(passwords.configure)
+    return passwords.calibration
+
+UPLOAD_WRITE_BYTES = 1024 * 1024
+
+@router.post("/imports", response_model=schemas.ImportStatus, status_code=status.HTTP_202_ACCEPTED)
+async def start_customer_import(request: Request):
+    """
+    Bulk-onboards customers from the request body (see bulk_import.py).
+    - Send CSV with `Content-Type: text/csv`, otherwise NDJSON is assumed.
+    - The body is streamed to BULK_IMPORT_DIR and imported in the background;
+      poll `GET /admin/imports/{job_id}` for progress.
+    """
+    file_format = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+    path = os.path.join(settings.BULK_IMPORT_DIR, f"import-{uuid.uuid4().hex}.{file_format}")
+    # File I/O runs in the threadpool, a buffer of about UPLOAD_WRITE_BYTES at a
+    # time, so a slow disk never blocks the event loop
+    upload = await run_in_threadpool(open, path, "wb")
+    try:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) >= UPLOAD_WRITE_BYTES:
+                await run_in_threadpool(upload.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(upload.write, bytes(buffer))
+    except BaseException:
+        await run_in_threadpool(upload.close)
+        await run_in_threadpool(os.remove, path)
+        raise
+    await run_in_threadpool(upload.close)
+
+    job_id = bulk_import.start_job(path, file_format)
+    return {"job_id": job_id, **bulk_import.jobs[job_id].snapshot()}
+
+@router.get("/imports/{job_id}", response_model=schemas.ImportStatus)
+async def get_customer_import(job_id: str):
+    """Progress of an import started through `POST /admin/imports`."""
+    progress = bulk_import.jobs.get(job_id)
+    if progress is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import job not found")
+    return {"job_id": job_id, **progress.snapshot()}
@@ -1,23 +1,45 @@
-import random
-import string
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from passlib.context import CryptContext
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime
+from typing import Optional
 
-import database, schemas, models, dependencies
+import database, schemas, models, dependencies, passwords, write_behind, account_numbers
 
 router = APIRouter(
     prefix="/auth",
     tags=["Authentication"]
 )
 
-# Password hashing setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def _user_with_accounts(user: models.User, customer: models.Customer) -> dict:
+    """
+    Builds the UserWithAccounts payload straight from the loaded rows; the
+    response model validates it once, with no intermediate schema copies.
+    """
+    return {
+        "user_id": user.user_id,
+        "username": user.username,
+        "email": customer.email,
+        "first_name": customer.first_name,
+        "last_name": customer.last_name,
+        "role": user.role,
+        "last_login": user.last_login,
+        "accounts": [
+            {
+                "account_id": account.account_id,
+                "account_number": account.account_number,
+                "account_type": account.account_type,
+                "balance": account.balance,
+            }
+            for account in customer.accounts
+        ],
+    }
 
 @router.post("/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def register_user(user_create: schemas.UserCreate, db: Session = Depends(database.get_db)):
+async def register_user(user_create: schemas.UserCreate, db: AsyncSession = Depends(database.get_async_db)):
     """
     Handles new user registration.
     - Creates a new Customer.
@@ -26,126 +48,177 @@ def register_user(user_create: schemas.UserCreate, db: Session = Depends(databas
     - Creates an initial 'savings' account for the user with an optional initial deposit.
     - All operations are performed in a single transaction.
     """
-    hashed_password = pwd_context.hash(user_create.password)
-
-    # Use a transaction to ensure all or nothing
-    with db.begin_nested():
-        try:
-            # 1. Create the customer
-            new_customer = models.Customer(
-                first_name=user_create.first_name,
-                last_name=user_create.last_name,
-                email=user_create.email,
-            )
-            db.add(new_customer)
-            db.flush() # Flush to get the customer_id
-
-            # 2. Create the user
-            new_user = models.User(
-                customer_id=new_customer.customer_id,
-                username=user_create.username,
-                password_hash=hashed_password,
-            )
-            db.add(new_user)
-            db.flush() # Flush to get the user_id
-
-            # 3. Create the initial savings account
-            account_number = ''.join(random.choices(string.digits, k=12))
-            initial_account = models.Account(
-                customer_id=new_customer.customer_id,
-                account_number=account_number,
-                account_type='savings',
-                balance=user_create.initial_deposit,
+    # bcrypt is CPU-bound; it runs in the password worker pool
+    hashed_password = await passwords.hash_password(user_create.password)
+    # Reserved up front, outside this request's transaction (it may need its
+    # own short transaction to reserve a new block)
+    account_number = await account_numbers.allocate()
+
+    # The session's transaction makes this all or nothing; nothing is
+    # persisted until the commit below.
+    try:
+        # 1. Create the customer
+        new_customer = models.Customer(
+            first_name=user_create.first_name,
+            last_name=user_create.last_name,
+            email=user_create.email,
+        )
+        db.add(new_customer)
+        await db.flush() # Flush to get the customer_id
+
+        # 2. Create the user
+        new_user = models.User(
+            customer_id=new_customer.customer_id,
+            username=user_create.username,
+            password_hash=hashed_password,
+        )
+        db.add(new_user)
+        await db.flush() # Flush to get the user_id
+
+        # 3. Create the initial savings account
+        initial_account = models.Account(
+            customer_id=new_customer.customer_id,
+            account_number=account_number,
+            account_type='savings',
+            balance=user_create.initial_deposit,
+        )
+        db.add(initial_account)
+        
+        # If initial deposit is > 0, create a transaction record
+        if user_create.initial_deposit > 0:
+            await db.flush() # Need to flush to get the account_id for the transaction
+            deposit_transaction = models.Transaction(
+                account_id=initial_account.account_id,
+                transaction_type='deposit',
+                amount=user_create.initial_deposit,
+                description='Initial account deposit'
             )
-            db.add(initial_account)
-            
-            # If initial deposit is > 0, create a transaction record
-            if user_create.initial_deposit > 0:
-                db.flush() # Need to flush to get the account_id for the transaction
-                deposit_transaction = models.Transaction(
-                    account_id=initial_account.account_id,
-                    transaction_type='deposit',
-                    amount=user_create.initial_deposit,
-                    description='Initial account deposit'
-                )
-                db.add(deposit_transaction)
-
-            db.commit()
-            
-            # Eagerly load customer data for the response
-            db.refresh(new_user, ["customer"])
-            return new_user
-
-        except IntegrityError as e:
-            db.rollback()
-            # Check for unique constraint violation
-            if "UNIQUE constraint failed: users.username" in str(e.orig) or "Duplicate entry" in str(e.orig) and "for key 'username'" in str(e.orig):
-                 raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Username already exists.")
-            if "UNIQUE constraint failed: customers.email" in str(e.orig) or "Duplicate entry" in str(e.orig) and "for key 'email'" in str(e.orig):
-                 raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered.")
-            if "UNIQUE constraint failed: accounts.account_number" in str(e.orig) or "Duplicate entry" in str(e.orig) and "for key 'account_number'" in str(e.orig):
-                 # This is unlikely but good to handle
-                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate a unique account number. Please try again.")
-            # For any other integrity error
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database integrity error: {e.orig}")
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred during registration: {e}")
+            db.add(deposit_transaction)
+
+        await db.commit()
+        
+        # Eagerly load customer data for the response
+        await db.refresh(new_user, ["customer"])
+        return new_user
+
+    except IntegrityError as e:
+        await db.rollback()
+        # Check for unique constraint violation
+        if "UNIQUE constraint failed: users.username" in str(e.orig) or "Duplicate entry" in str(e.orig) and "for key 'username'" in str(e.orig):
+             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Username already exists.")
+        if "UNIQUE constraint failed: customers.email" in str(e.orig) or "Duplicate entry" in str(e.orig) and "for key 'email'" in str(e.orig):
+             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered.")
+        if "UNIQUE constraint failed: accounts.account_number" in str(e.orig) or "Duplicate entry" in str(e.orig) and "for key 'account_number'" in str(e.orig):
+             # This is unlikely but good to handle
+             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate a unique account number. Please try again.")
+        # For any other integrity error
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database integrity error: {e.orig}")
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred during registration: {e}")
 
 
 @router.post("/login", response_model=schemas.LoginResponse)
-def login_for_access_token(form_data: schemas.UserLogin, db: Session = Depends(database.get_db)):
+async def login_for_access_token(
+    form_data: schemas.UserLogin,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(database.get_async_db)
+):
     """
     Handles user login.
     - Verifies username and password.
     - If valid, creates and returns a JWT token along with user data.
+    - If the stored hash's bcrypt cost is outside policy, it is rehashed after
+      the response is sent.
     """
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-
-    if not user or not pwd_context.verify(form_data.password, user.password_hash):
+    # User, customer and accounts in one query
+    result = await db.execute(
+        select(models.User)
+        .where(models.User.username == form_data.username)
+        .options(joinedload(models.User.customer).joinedload(models.Customer.accounts))
+    )
+    user = result.unique().scalars().first()
+    # End the read transaction so the connection goes back to the pool while
+    # bcrypt runs (the session doesn't expire instances on commit).
+    await db.commit()
+
+    if not user or not await passwords.verify_password(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Update last_login time
-    user.last_login = datetime.utcnow()
-    db.commit()
-    db.refresh(user)
+    # Update last_login time. The write is buffered and flushed in bulk later,
+    # so the login response doesn't wait for it.
+    now = datetime.utcnow()
+    write_behind.record(models.User, user.user_id, last_login=now)
+    set_committed_value(user, "last_login", now)
+    dependencies.remember_principal(user)
+
+    if passwords.needs_rehash(user.password_hash):
+        background_tasks.add_task(passwords.rehash_password, user.user_id, user.username, user.password_hash, form_data.password)
 
     # Create JWT token
-    access_token = dependencies.create_access_token(data={"sub": user.username})
+    access_token = dependencies.create_access_token(data={
+        "sub": user.username,
+        **dependencies.account_scope_claims(user.customer_id, [account.account_id for account in user.customer.accounts]),
+    })
     
-    # Manually build the user response model
-    user_details = schemas.User.from_orm(user)
-    accounts = [schemas.Account.from_orm(acc) for acc in user.customer.accounts]
-    user_with_accounts = schemas.UserWithAccounts(**user_details.dict(), accounts=accounts)
-
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "user": user_with_accounts
+        "user": _user_with_accounts(user, user.customer)
     }
 
 
+@router.post("/refresh", response_model=schemas.Token)
+async def refresh_access_token(
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
+    """
+    Issues a new access token with a fresh expiry and the user's current
+    account scope. Call it after opening an account so the new account is
+    authorized from the token too.
+    """
+    result = await db.execute(
+        select(models.Account.account_id).where(models.Account.customer_id == current_user.customer_id)
+    )
+    access_token = dependencies.create_access_token(data={
+        "sub": current_user.username,
+        **dependencies.account_scope_claims(current_user.customer_id, result.scalars().all()),
+    })
+    return {"access_token": access_token, "token_type": "bearer"}
+
+
 @router.post("/logout", response_model=schemas.Msg)
-def logout():
+def logout(token: Optional[str] = Depends(dependencies.optional_oauth2_scheme)):
     """
-    User logout. For JWT, this is a symbolic endpoint.
-    The client is responsible for deleting the token.
+    User logout.
+    - Revokes the bearer token, if one was sent, for the rest of its lifetime.
+    - The client is still responsible for deleting the token.
     """
+    if token:
+        dependencies.revoke_token(token)
     return {"message": "Successfully logged out"}
 
 
 @router.get("/me", response_model=schemas.UserWithAccounts)
-async def read_users_me(current_user: models.User = Depends(dependencies.get_current_active_user)):
+async def read_users_me(
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
     """
     Returns the details of the currently authenticated user,
     including their associated bank accounts.
     """
-    # The dependency already fetches the user. We just need to format the response.
-    user_data = schemas.User.from_orm(current_user)
-    accounts_data = [schemas.Account.from_orm(acc) for acc in current_user.customer.accounts]
-    
-    return schemas.UserWithAccounts(**user_data.dict(), accounts=accounts_data)
+    # current_user usually comes from the principal cache, so this is the
+    # only query: the customer and their accounts together.
+    result = await db.execute(
+        select(models.Customer)
+        .where(models.Customer.customer_id == current_user.customer_id)
+        .options(joinedload(models.Customer.accounts))
+    )
+    customer = result.unique().scalar_one()
+    return _user_with_accounts(current_user, customer)
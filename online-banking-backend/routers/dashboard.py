@@ -0,0 +1,85 @@
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+import schemas, models, dependencies, etags
+from config import settings
+
+router = APIRouter(
+    prefix="/dashboard",
+    tags=["Dashboard"],
+    dependencies=[Depends(dependencies.get_current_active_user)]
+)
+
+def _recent_transactions(account_ids: list, limit: int):
+    """
+    The newest `limit` transactions of each account in one query:
+    ROW_NUMBER() numbers each account's rows newest first, and only the first
+    `limit` of every account are kept.
+    """
+    row_number = func.row_number().over(
+        partition_by=models.Transaction.account_id,
+        order_by=(models.Transaction.transaction_date.desc(), models.Transaction.transaction_id.desc()),
+    ).label("row_number")
+    ranked = (
+        select(models.Transaction, row_number)
+        .where(models.Transaction.account_id.in_(account_ids))
+        .subquery()
+    )
+    transaction = aliased(models.Transaction, ranked)
+    return (
+        select(transaction)
+        .where(ranked.c.row_number <= limit)
+        .order_by(ranked.c.account_id, ranked.c.row_number)
+    )
+
+@router.get("", response_model=schemas.Dashboard)
+async def get_dashboard(
+    request: Request,
+    response: Response,
+    limit: int = Query(settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE, description="Transactions per account"),
+    db: AsyncSession = Depends(dependencies.get_read_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
+    """
+    Everything the dashboard shows: the user's accounts, each with its most
+    recent transactions (20 by default), in two queries.
+    - Accounts are looked up by the user's customer_id, so no further ownership
+      checks are needed.
+    - Tagged with every account's id and version; a matching If-None-Match
+      gets a 304 without querying the transactions.
+    """
+    result = await db.execute(
+        select(models.Account)
+        .where(models.Account.customer_id == current_user.customer_id)
+        .order_by(models.Account.account_id)
+    )
+    accounts = result.scalars().all()
+
+    etag = etags.make_etag(
+        "dashboard", etags.version_digest((account.account_id, account.version) for account in accounts), limit
+    )
+    if etags.matches(request, etag):
+        return etags.not_modified(etag)
+    etags.tag(response, etag)
+
+    recent = {account.account_id: [] for account in accounts}
+    if accounts:
+        result = await db.execute(_recent_transactions(list(recent), limit))
+        for transaction in result.scalars():
+            recent[transaction.account_id].append(transaction)
+
+    return {
+        "accounts": [
+            {
+                "account_id": account.account_id,
+                "account_number": account.account_number,
+                "account_type": account.account_type,
+                "balance": account.balance,
+                "version": account.version,
+                "recent_transactions": recent[account.account_id],
+            }
+            for account in accounts
+        ]
+    }
@@ -0,0 +1,69 @@
+import json
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models, dependencies, database, metrics, account_events
+from config import settings
+
+router = APIRouter(
+    prefix="/events",
+    tags=["Events"],
+    dependencies=[Depends(dependencies.get_current_active_user)]
+)
+
+def _format(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+async def _stream(account_ids):
+    subscription = account_events.subscribe(account_ids)
+    metrics.increment("events.connections")
+    deadline = time.monotonic() + settings.EVENTS_MAX_STREAM_SECONDS
+    try:
+        # `retry` is how long EventSource-style clients wait before reconnecting
+        yield "retry: 1000\n\n" + _format("ready", {"account_ids": sorted(account_ids)})
+        while (remaining := deadline - time.monotonic()) > 0:
+            item = await subscription.next(min(settings.EVENTS_KEEPALIVE_SECONDS, remaining))
+            if item is None:
+                yield ": keepalive\n\n"
+            else:
+                yield _format(*item)
+    finally:
+        # Also runs when the client disconnects and the response is cancelled
+        account_events.unsubscribe(subscription)
+
+@router.get("/stream")
+async def stream_account_events(
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user)
+):
+    """
+    Server-Sent Events stream of changes to the user's accounts.
+    - `ready` is sent first; load the accounts after receiving it so no change is missed.
+    - `transaction` for every ledger entry and `balance` with the committed balance
+      and version of each account involved.
+    - `resync` when the connection fell too far behind and events were dropped;
+      re-fetch the accounts.
+    - The stream ends after EVENTS_MAX_STREAM_SECONDS; reconnect and load the
+      accounts again. Accounts opened in the meantime are included from then on.
+    """
+    if account_events.at_capacity():
+        metrics.increment("events.rejected")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many live connections. Please try again later.")
+
+    result = await db.execute(
+        select(models.Account.account_id).where(models.Account.customer_id == current_user.customer_id)
+    )
+    account_ids = set(result.scalars().all())
+    # The stream outlives the request's session; don't keep its connection checked out
+    await db.commit()
+
+    return StreamingResponse(
+        _stream(account_ids),
+        media_type="text/event-stream",
+        # no-transform/X-Accel-Buffering keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"},
+    )
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from typing import List
+from datetime import datetime
 
-import database, schemas, models, dependencies
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Optional
+
+import database, schemas, models, dependencies, pagination, ledger, idempotency, etags, exports
+from config import settings
 
 router = APIRouter(
     prefix="/transactions",
@@ -11,142 +15,393 @@ router = APIRouter(
     dependencies=[Depends(dependencies.get_current_active_user)]
 )
 
-def check_account_ownership(db: Session, account_id: int, user_id: int):
+async def check_account_ownership(db: AsyncSession, account_id: int, customer_id: int, account_scope=None):
     """
     Helper function to verify that an account belongs to the logged-in user.
+    - Accounts listed in the token's signed account scope pass without a query.
+    - Anything else (no scope, or an account opened after the token was issued)
+      is checked against the database.
     """
-    account = db.query(models.Account).filter(models.Account.account_id == account_id).first()
+    if account_scope is not None and account_id in account_scope:
+        return
+    account = await db.get(models.Account, account_id)
     if not account:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Account with ID {account_id} not found.")
-    
-    # Fetch the customer associated with the user
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    if not user or account.customer_id != user.customer_id:
+    if account.customer_id != customer_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform operations on this account.")
-    return account
+
+async def _owned_account_version(db: AsyncSession, account_id: int, customer_id: int) -> int:
+    """Ownership check that also returns the account's version (one primary key lookup)."""
+    row = (await db.execute(
+        select(models.Account.customer_id, models.Account.version).where(models.Account.account_id == account_id)
+    )).first()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Account with ID {account_id} not found.")
+    if row.customer_id != customer_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform operations on this account.")
+    return row.version
 
 @router.post("/deposit", response_model=schemas.Msg)
-def deposit_funds(
+async def deposit_funds(
     request: schemas.DepositWithdrawRequest,
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(dependencies.get_current_active_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+    account_scope: Optional[frozenset] = Depends(dependencies.get_account_scope),
+    idempotency_key: Optional[str] = Header(None, description="Repeat requests with the same key are applied only once")
 ):
     """
-    Deposits funds into a specified account by calling the `Deposit` stored procedure.
+    Deposits funds into a specified account (see `ledger` for the execution path).
     - Validates that the user owns the account.
+    - Send an `Idempotency-Key` header to make retries safe: a repeated key replays the first response.
     """
-    check_account_ownership(db, request.account_id, current_user.user_id)
+    # Read before any rollback: a retry expires current_user along with the rest of the session
+    user_id, customer_id = current_user.user_id, current_user.customer_id
+    return await idempotency.run(
+        user_id, idempotency_key, "deposit", request.model_dump(),
+        lambda: _deposit(db, request, user_id, customer_id, account_scope)
+    )
+
+async def _deposit(db: AsyncSession, request: schemas.DepositWithdrawRequest, user_id: int, customer_id: int, account_scope):
+    await check_account_ownership(db, request.account_id, customer_id, account_scope)
     
     try:
-        # Call the stored procedure
-        db.execute(
-            text("CALL Deposit(:account_id, :amount)"),
-            {"account_id": request.account_id, "amount": request.amount}
-        )
-        db.commit()
+        success = await ledger.retry_on_lock_conflict(db, lambda: ledger.deposit(db, request.account_id, request.amount))
+        if not success:
+            # Only the direct path can fail here: the account vanished after the ownership check
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Account with ID {request.account_id} not found.")
+        await db.commit()
+        database.mark_write(user_id)
         return {"message": f"Successfully deposited {request.amount} into account {request.account_id}."}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        if isinstance(e, HTTPException):
+            raise e
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An error occurred during the deposit: {e}")
 
 @router.post("/withdraw", response_model=schemas.Msg)
-def withdraw_funds(
+async def withdraw_funds(
     request: schemas.DepositWithdrawRequest,
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(dependencies.get_current_active_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+    account_scope: Optional[frozenset] = Depends(dependencies.get_account_scope),
+    idempotency_key: Optional[str] = Header(None, description="Repeat requests with the same key are applied only once")
 ):
     """
-    Withdraws funds from a specified account by calling the `Withdraw` stored procedure.
+    Withdraws funds from a specified account (see `ledger` for the execution path).
     - Validates that the user owns the account.
-    - Checks the output of the stored procedure to confirm success.
+    - Fails with 400 if the account does not hold enough funds.
+    - Send an `Idempotency-Key` header to make retries safe: a repeated key replays the first response.
     """
-    check_account_ownership(db, request.account_id, current_user.user_id)
+    # Read before any rollback: a retry expires current_user along with the rest of the session
+    user_id, customer_id = current_user.user_id, current_user.customer_id
+    return await idempotency.run(
+        user_id, idempotency_key, "withdraw", request.model_dump(),
+        lambda: _withdraw(db, request, user_id, customer_id, account_scope)
+    )
+
+async def _withdraw(db: AsyncSession, request: schemas.DepositWithdrawRequest, user_id: int, customer_id: int, account_scope):
+    await check_account_ownership(db, request.account_id, customer_id, account_scope)
     
     try:
-        # The stored procedure has an OUT parameter `success`
-        result = db.execute(
-            text("CALL Withdraw(:account_id, :amount, @success)"),
-            {"account_id": request.account_id, "amount": request.amount}
-        )
-        # Fetch the value of the OUT parameter
-        success_row = db.execute(text("SELECT @success")).fetchone()
-        
-        db.commit()
+        success = await ledger.retry_on_lock_conflict(db, lambda: ledger.withdraw(db, request.account_id, request.amount))
+        await db.commit()
 
-        if success_row and success_row[0] == 1:
+        if success:
+            database.mark_write(user_id)
             return {"message": f"Successfully withdrew {request.amount} from account {request.account_id}."}
         else:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Withdrawal failed. Check for insufficient funds.")
             
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # Propagate specific exceptions from the procedure call if possible
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An error occurred during the withdrawal: {e}")
 
 @router.post("/transfer", response_model=schemas.Msg)
-def transfer_funds(
+async def transfer_funds(
     request: schemas.TransferRequest,
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(dependencies.get_current_active_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+    account_scope: Optional[frozenset] = Depends(dependencies.get_account_scope),
+    idempotency_key: Optional[str] = Header(None, description="Repeat requests with the same key are applied only once")
 ):
     """
-    Transfers funds between two accounts by calling the `TransferFunds` stored procedure.
+    Transfers funds between two accounts (see `ledger` for the execution path).
     - Validates that the user owns the 'from' account.
-    - Checks the output of the stored procedure to confirm success.
+    - Fails with 400 if the source account does not hold enough funds.
+    - Send an `Idempotency-Key` header to make retries safe: a repeated key replays the first response.
     """
+    # Read before any rollback: a retry expires current_user along with the rest of the session
+    user_id, customer_id = current_user.user_id, current_user.customer_id
+    return await idempotency.run(
+        user_id, idempotency_key, "transfer", request.model_dump(),
+        lambda: _transfer(db, request, user_id, customer_id, account_scope)
+    )
+
+async def _transfer(db: AsyncSession, request: schemas.TransferRequest, user_id: int, customer_id: int, account_scope):
     if request.from_account_id == request.to_account_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot transfer funds to the same account.")
 
-    check_account_ownership(db, request.from_account_id, current_user.user_id)
+    await check_account_ownership(db, request.from_account_id, customer_id, account_scope)
     
-    # Check if the destination account exists
-    to_account = db.query(models.Account).filter(models.Account.account_id == request.to_account_id).first()
-    if not to_account:
+    # Check if the destination account exists (known if it's one of the user's own)
+    to_account_known = account_scope is not None and request.to_account_id in account_scope
+    if not to_account_known and not await db.get(models.Account, request.to_account_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Destination account with ID {request.to_account_id} not found.")
 
     try:
-        # Call the stored procedure with the OUT parameter
-        result = db.execute(
-            text("CALL TransferFunds(:from_id, :to_id, :amount, @success)"),
-            {
-                "from_id": request.from_account_id,
-                "to_id": request.to_account_id,
-                "amount": request.amount
-            }
+        success = await ledger.retry_on_lock_conflict(
+            db, lambda: ledger.transfer(db, request.from_account_id, request.to_account_id, request.amount)
         )
-        success_row = db.execute(text("SELECT @success")).fetchone()
-        
-        db.commit()
+        await db.commit()
 
-        if success_row and success_row[0] == 1:
+        if success:
+            database.mark_write(user_id)
             return {"message": f"Successfully transferred {request.amount} from account {request.from_account_id} to {request.to_account_id}."}
         else:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Transfer failed. Check for insufficient funds in the source account.")
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An error occurred during the transfer: {e}")
 
+@router.post("/batch", response_model=schemas.BatchResponse)
+async def batch_transactions(
+    request: schemas.BatchRequest,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+    account_scope: Optional[frozenset] = Depends(dependencies.get_account_scope),
+    idempotency_key: Optional[str] = Header(None, description="Repeat requests with the same key are applied only once")
+):
+    """
+    Executes many deposit/withdraw/transfer operations in one request.
+    - Ownership of every referenced account is validated with a single query, or
+      none if they are all in the token's account scope.
+    - By default operations run in order and each one is committed on its own, so a
+      failed operation (unknown account, insufficient funds, ...) does not undo the others.
+    - With `atomic: true` the whole batch is one DB transaction: either every operation
+      is applied or none is. This needs the direct ledger path, since the stored
+      procedures commit each call themselves.
+    - Returns one result per operation, in request order.
+    - Accepts an `Idempotency-Key` header like the single-operation endpoints.
+    """
+    # A rollback expires every instance in the session, including current_user,
+    # so read what we need from it before running any operation.
+    user_id, customer_id = current_user.user_id, current_user.customer_id
+    return await idempotency.run(
+        user_id, idempotency_key, "batch", request.model_dump(),
+        lambda: _batch(db, request, user_id, customer_id, account_scope)
+    )
+
+async def _batch(db: AsyncSession, request: schemas.BatchRequest, user_id: int, customer_id: int, account_scope):
+    if request.atomic and not ledger.uses_direct_path():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Atomic batches are not available while balance changes run through stored procedures."
+        )
+
+    account_ids = {op.account_id for op in request.operations}
+    account_ids |= {op.to_account_id for op in request.operations if op.to_account_id is not None}
+    if account_scope is not None and account_ids <= account_scope:
+        # Every referenced account is in the token's signed scope
+        owners = dict.fromkeys(account_ids, customer_id)
+    else:
+        result = await db.execute(
+            select(models.Account.account_id, models.Account.customer_id)
+            .where(models.Account.account_id.in_(account_ids))
+        )
+        owners = {row.account_id: row.customer_id for row in result}
+    errors = [_validate_batch_operation(op, owners, customer_id) for op in request.operations]
+
+    if request.atomic:
+        results = await _run_atomic_batch(db, request.operations, errors)
+    else:
+        results = await _run_batch(db, request.operations, errors)
+
+    succeeded = sum(1 for item in results if item.success)
+    if succeeded:
+        database.mark_write(user_id)
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+async def _run_batch(db: AsyncSession, operations: list, errors: list):
+    """Applies and commits each valid operation independently."""
+    results = []
+    for index, (op, error) in enumerate(zip(operations, errors)):
+        if error:
+            results.append(schemas.BatchItemResult(index=index, success=False, message=error))
+            continue
+
+        try:
+            success = await ledger.retry_on_lock_conflict(db, lambda: _apply_batch_operation(db, op))
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            message = e.detail if isinstance(e, HTTPException) else f"An error occurred: {e}"
+            results.append(schemas.BatchItemResult(index=index, success=False, message=message))
+            continue
+
+        if success:
+            results.append(schemas.BatchItemResult(index=index, success=True, message=f"{op.type.capitalize()} of {op.amount} completed."))
+        else:
+            results.append(schemas.BatchItemResult(index=index, success=False, message=_failure_message(op)))
+    return results
+
+async def _run_atomic_batch(db: AsyncSession, operations: list, errors: list):
+    """Applies every operation in one transaction; the first failure rolls all of them back."""
+    failed_index, failure = None, None
+    current = {"index": None}
+
+    async def apply_all():
+        # Re-run from the first operation on a lock conflict retry
+        for index, op in enumerate(operations):
+            current["index"] = index
+            if not await _apply_batch_operation(db, op):
+                # The ledger helper already rolled the transaction back
+                return index
+        return None
+
+    if any(errors):
+        failed_index = next(index for index, error in enumerate(errors) if error)
+        failure = errors[failed_index]
+    else:
+        try:
+            failed_index = await ledger.retry_on_lock_conflict(db, apply_all)
+            if failed_index is None:
+                await db.commit()
+            else:
+                failure = _failure_message(operations[failed_index])
+        except Exception as e:
+            await db.rollback()
+            failed_index = current["index"]
+            failure = e.detail if isinstance(e, HTTPException) else f"An error occurred: {e}"
+
+    results = []
+    for index, op in enumerate(operations):
+        if failed_index is None:
+            results.append(schemas.BatchItemResult(index=index, success=True, message=f"{op.type.capitalize()} of {op.amount} completed."))
+        elif index == failed_index:
+            results.append(schemas.BatchItemResult(index=index, success=False, message=failure))
+        else:
+            results.append(schemas.BatchItemResult(index=index, success=False, message=f"Not applied: operation {failed_index} failed."))
+    return results
+
+async def _apply_batch_operation(db: AsyncSession, op: schemas.BatchOperation) -> bool:
+    if op.type == "deposit":
+        return await ledger.deposit(db, op.account_id, op.amount)
+    if op.type == "withdraw":
+        return await ledger.withdraw(db, op.account_id, op.amount)
+    return await ledger.transfer(db, op.account_id, op.to_account_id, op.amount)
+
+def _failure_message(op: schemas.BatchOperation) -> str:
+    """Why a ledger helper refused an operation: deposits only fail for a missing account."""
+    if op.type == "deposit":
+        return f"Account with ID {op.account_id} not found."
+    return "Insufficient funds."
+
+def _validate_batch_operation(op: schemas.BatchOperation, owners: dict, customer_id: int):
+    """Returns an error message for an operation that must not run, or None."""
+    if op.account_id not in owners:
+        return f"Account with ID {op.account_id} not found."
+    if owners[op.account_id] != customer_id:
+        return "Not authorized to perform operations on this account."
+    if op.type == "transfer":
+        if op.to_account_id is None:
+            return "Transfers require to_account_id."
+        if op.to_account_id == op.account_id:
+            return "Cannot transfer funds to the same account."
+        if op.to_account_id not in owners:
+            return f"Destination account with ID {op.to_account_id} not found."
+    return None
+
+@router.get("/{account_id}/history", response_model=schemas.TransactionPage)
+async def get_transaction_history(
+    account_id: int,
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor or prev_cursor"),
+    limit: int = Query(settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(dependencies.get_read_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+    account_scope: Optional[frozenset] = Depends(dependencies.get_account_scope)
+):
+    """
+    Cursor-paginated transaction history for an account, newest first.
+    - Follow `next_cursor` for older transactions and `prev_cursor` for newer ones.
+    - Pages are keyed on (transaction_date, transaction_id), so deep pages are as cheap as the first.
+    """
+    await check_account_ownership(db, account_id, current_user.customer_id, account_scope)
+
+    stmt, direction = pagination.keyset_page(
+        select(models.Transaction).where(models.Transaction.account_id == account_id),
+        models.Transaction.transaction_date,
+        models.Transaction.transaction_id,
+        limit,
+        cursor,
+    )
+    rows = (await db.execute(stmt)).scalars().all()
+    items, next_cursor, prev_cursor = pagination.page_cursors(rows, limit, direction, cursor is not None)
+
+    return {"items": items, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+@router.get("/{account_id}/export")
+async def export_transactions(
+    account_id: int,
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    date_from: Optional[datetime] = Query(None, alias="from", description="Earliest transaction_date included"),
+    date_to: Optional[datetime] = Query(None, alias="to", description="Transactions before this time are included"),
+    gzip: bool = Query(False, description="Send the file gzip compressed"),
+    db: AsyncSession = Depends(dependencies.get_read_db),
+    current_user: models.User = Depends(dependencies.get_current_active_user),
+    account_scope: Optional[frozenset] = Depends(dependencies.get_account_scope)
+):
+    """
+    Downloads an account's transactions, oldest first, as CSV or NDJSON.
+    - Streamed straight from the database (see `exports`), so any range can be
+      exported without the rows being held in memory.
+    - `from`/`to` limit the period; `gzip=true` returns a .gz file.
+    """
+    await check_account_ownership(db, account_id, current_user.customer_id, account_scope)
+    # The export opens its own session; don't keep this one's connection checked out meanwhile
+    read_only = db.info.get("read_only", False)
+    await db.commit()
+
+    filename = f"account-{account_id}-transactions.{export_format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        exports.stream_transactions(account_id, export_format, date_from, date_to, read_only=read_only, compress=gzip),
+        media_type="application/gzip" if gzip else exports.MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 @router.get("/{account_id}", response_model=List[schemas.Transaction])
-def get_account_transactions(
+async def get_account_transactions(
     account_id: int,
-    db: Session = Depends(database.get_db),
+    request: Request,
+    response: Response,
+    limit: int = Query(settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(dependencies.get_read_db),
     current_user: models.User = Depends(dependencies.get_current_active_user)
 ):
     """
-    Retrieves the last 20 transactions for a specific account.
+    Retrieves the most recent transactions for a specific account (20 by default).
     - Ensures the user owns the account before returning the history.
+    - Use `/transactions/{account_id}/history` to page further back.
+    - Tagged with the account's version, which changes with every new transaction;
+      a matching If-None-Match gets a 304 without querying the transactions.
     """
-    check_account_ownership(db, account_id, current_user.user_id)
-    
-    transactions = db.query(models.Transaction)\
-        .filter(models.Transaction.account_id == account_id)\
-        .order_by(models.Transaction.transaction_date.desc())\
-        .limit(20)\
-        .all()
+    version = await _owned_account_version(db, account_id, current_user.customer_id)
+    etag = etags.make_etag("transactions", account_id, version, limit)
+    if etags.matches(request, etag):
+        return etags.not_modified(etag)
+    etags.tag(response, etag)
+
+    result = await db.execute(
+        select(models.Transaction)
+        .where(models.Transaction.account_id == account_id)
+        .order_by(models.Transaction.transaction_date.desc(), models.Transaction.transaction_id.desc())
+        .limit(limit)
+    )
+    transactions = result.scalars().all()
         
     return transactions
@@ -1,6 +1,8 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import List, Optional
-from datetime import datetime
+from typing import FrozenSet, List, Literal, Optional
+from datetime import date, datetime
+
+from config import settings
 
 # ==================================
 # Base and Response Schemas
@@ -43,6 +45,40 @@ class Transaction(BaseModel):
     class Config:
         from_attributes = True
 
+class StatementPeriod(BaseModel):
+    period_start: date
+    opening_balance: float
+    closing_balance: float
+    deposits: float
+    withdrawals: float
+    transfers_in: float
+    transfers_out: float
+    transaction_count: int
+    closed: bool
+
+    class Config:
+        from_attributes = True
+
+class DailyBalance(BaseModel):
+    day: date
+    closing_balance: float
+    credits: float
+    debits: float
+    transaction_count: int
+
+    class Config:
+        from_attributes = True
+
+class BalanceHistory(BaseModel):
+    account_id: int
+    opening_balance: float  # Balance at the start of the first day requested
+    days: List[DailyBalance]  # Only days with transactions; the balance carries over in between
+
+class TransactionPage(BaseModel):
+    items: List[Transaction]
+    next_cursor: Optional[str] = None  # older transactions
+    prev_cursor: Optional[str] = None  # newer transactions
+
 # ==================================
 # Request Body Schemas
 # ==================================
@@ -68,6 +104,26 @@ class TransferRequest(BaseModel):
     to_account_id: int
     amount: float = Field(..., gt=0, description="Amount must be positive")
 
+class BatchOperation(BaseModel):
+    type: Literal["deposit", "withdraw", "transfer"]
+    account_id: int  # credited for deposits, debited for withdrawals and transfers
+    to_account_id: Optional[int] = None  # transfers only
+    amount: float = Field(..., gt=0, description="Amount must be positive")
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=settings.BATCH_MAX_OPERATIONS)
+    atomic: bool = False  # all-or-nothing in one DB transaction (direct ledger path only)
+
+class BatchItemResult(BaseModel):
+    index: int
+    success: bool
+    message: str
+
+class BatchResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
+
 # ==================================
 # Token/Session Schemas
 # ==================================
@@ -78,11 +134,63 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    # Signed account scope; None when the token doesn't carry one
+    customer_id: Optional[int] = None
+    account_ids: Optional[FrozenSet[int]] = None
 
 class Msg(BaseModel):
     message: str
 
+class DashboardAccount(Account):
+    version: int
+    recent_transactions: List[Transaction] = []
+
+class Dashboard(BaseModel):
+    accounts: List[DashboardAccount]
+
 class LoginResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
     user: UserWithAccounts
+
+# ==================================
+# Admin / Diagnostics Schemas
+# ==================================
+
+class PoolStatus(BaseModel):
+    name: str
+    profile: str
+    liveness: str
+    pool_size: int
+    max_overflow: int
+    checked_out: int
+    checked_in: int
+    overflow_in_use: int
+    checkouts: int
+    timeouts: int
+    liveness_pings: int
+    avg_wait_ms: float
+    p95_wait_ms: float
+    max_wait_ms: float
+
+class PasswordHashingStatus(BaseModel):
+    rounds: int
+    source: str  # "calibrated" or "configured" (BCRYPT_ROUNDS)
+    estimated_hash_ms: Optional[float] = None
+    target_ms: float
+    min_rounds: int
+    max_rounds: int
+    calibrated_at: Optional[datetime] = None
+
+class ImportStatus(BaseModel):
+    job_id: str
+    source: str
+    status: str  # "running", "completed" or "failed"
+    rows_done: int
+    imported: int
+    failed: int
+    rows_per_second: float
+    error: Optional[str] = None
+    error_report: Optional[str] = None  # Server path of the per-row error report
+    started_at: datetime
+    finished_at: Optional[datetime] = None
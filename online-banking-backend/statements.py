@@ -0,0 +1,205 @@
+"""
+Monthly statements.
+
+statement_periods holds one row per account and month with activity: opening
+and closing balance, totals per transaction type and the transaction count.
+GET /accounts/{id}/statements reads it by primary key, one row per month.
+
+- On MySQL the `update_ledger_summaries` trigger (init_db.py) keeps the
+  current month's rows up to date as ledger rows are inserted.
+- The closing job rebuilds a finished month from the ledger for all accounts
+  at once (one INSERT ... SELECT over that month's date range) and marks its
+  rows closed. Run it nightly: a month that is already closed is skipped.
+- Backfill rebuilds past months newest first. Each month's closing balance is
+  the next month's opening balance, so no month needs to scan further than
+  its own transactions.
+
+Databases without the trigger (SQLite in development) can bring the current
+month up to date with `rebuild`. On MySQL, `rebuild` the current month once
+after installing the trigger, before the first backfill.
+
+Usage:
+    python statements.py close                      # previous month, if not yet closed
+    python statements.py close --month 2026-09
+    python statements.py backfill --since 2024-01
+    python statements.py rebuild --month 2026-10    # without closing it
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import Date, case, delete, func, insert, literal, select
+from sqlalchemy.orm import aliased
+
+import database, models
+
+# --- Months ---
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def next_month(start: date) -> date:
+    return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+def previous_month(start: date) -> date:
+    return date(start.year - (start.month == 1), (start.month - 2) % 12 + 1, 1)
+
+def parse_month(value: str) -> date:
+    """'2026-09' -> date(2026, 9, 1)."""
+    year, month = value.split("-")
+    return date(int(year), int(month), 1)
+
+# --- Rebuilding from the ledger ---
+
+transactions = models.Transaction.__table__
+accounts = models.Account.__table__
+periods = models.StatementPeriod.__table__
+
+CREDIT_TYPES = ("deposit", "transfer_in")
+
+def signed_amount(table):
+    """Signed amount: credits add to the balance, everything else is a debit."""
+    return case((table.c.transaction_type.in_(CREDIT_TYPES), table.c.amount), else_=-table.c.amount)
+
+def _total(transaction_type: str):
+    return func.sum(case((transactions.c.transaction_type == transaction_type, transactions.c.amount), else_=0))
+
+def _period_rows(start: date, end: date, closed: bool):
+    """SELECT producing the statement_periods rows of [start, end) for every account with activity."""
+    activity = (
+        select(
+            transactions.c.account_id,
+            _total("deposit").label("deposits"),
+            _total("withdrawal").label("withdrawals"),
+            _total("transfer_in").label("transfers_in"),
+            _total("transfer_out").label("transfers_out"),
+            func.sum(signed_amount(transactions)).label("net"),
+            func.count().label("transaction_count"),
+        )
+        .where(transactions.c.transaction_date >= start, transactions.c.transaction_date < end)
+        .group_by(transactions.c.account_id)
+        .subquery()
+    )
+
+    # The closing balance is the opening balance of the account's next period
+    # with a row; failing that, today's balance minus everything booked since.
+    next_opening = (
+        select(periods.c.opening_balance)
+        .where(periods.c.account_id == activity.c.account_id, periods.c.period_start >= end)
+        .order_by(periods.c.period_start)
+        .limit(1)
+        .scalar_subquery()
+    )
+    later = aliased(transactions)
+    booked_since = (
+        select(func.coalesce(func.sum(signed_amount(later)), 0))
+        .where(later.c.account_id == activity.c.account_id, later.c.transaction_date >= end)
+        .scalar_subquery()
+    )
+    closing = func.coalesce(next_opening, accounts.c.balance - booked_since)
+
+    return (
+        select(
+            activity.c.account_id,
+            literal(start, Date).label("period_start"),
+            (closing - activity.c.net).label("opening_balance"),
+            closing.label("closing_balance"),
+            activity.c.deposits,
+            activity.c.withdrawals,
+            activity.c.transfers_in,
+            activity.c.transfers_out,
+            activity.c.transaction_count,
+            literal(closed).label("closed"),
+        )
+        .join(accounts, accounts.c.account_id == activity.c.account_id)
+    )
+
+_COLUMNS = [
+    "account_id", "period_start", "opening_balance", "closing_balance",
+    "deposits", "withdrawals", "transfers_in", "transfers_out", "transaction_count", "closed",
+]
+
+async def rebuild_month(start: date, closed: bool = False) -> int:
+    """
+    Replaces every statement_periods row of the month starting at `start` with
+    one computed from the ledger, in one transaction. Later months must already
+    be correct. Returns the number of accounts with activity.
+    """
+    async with database.AsyncSessionLocal() as db:
+        await db.execute(delete(periods).where(periods.c.period_start == start))
+        result = await db.execute(
+            insert(periods).from_select(_COLUMNS, _period_rows(start, next_month(start), closed))
+        )
+        await db.commit()
+    return result.rowcount
+
+async def is_closed(start: date) -> bool:
+    """True if the month has rows and all of them are closed."""
+    async with database.AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(func.count(), func.sum(case((periods.c.closed, 0), else_=1)))
+            .where(periods.c.period_start == start)
+        )).one()
+    return row[0] > 0 and not row[1]
+
+async def close_month(start: date, force: bool = False) -> int:
+    """Rebuilds a finished month from the ledger and marks it closed. Returns rows written, or -1 if skipped."""
+    if start >= month_start(date.today()):
+        raise ValueError(f"{start:%Y-%m} has not ended yet")
+    if not force and await is_closed(start):
+        return -1
+    return await rebuild_month(start, closed=True)
+
+async def backfill(since: date, on_month=None) -> int:
+    """
+    Closes every finished month from last month back to `since`, newest first,
+    so each month can take its closing balances from the month after it.
+    """
+    total = 0
+    start = previous_month(month_start(date.today()))
+    while start >= since:
+        written = await rebuild_month(start, closed=True)
+        total += written
+        if on_month:
+            on_month(start, written)
+        start = previous_month(start)
+    return total
+
+# --- CLI ---
+
+def _print_month(start: date, written: int):
+    print(f"{start:%Y-%m}   {written:>9} accounts", flush=True)
+
+async def main(args):
+    started = time.perf_counter()
+    if args.command == "close":
+        start = parse_month(args.month) if args.month else previous_month(month_start(date.today()))
+        written = await close_month(start, force=args.force)
+        if written < 0:
+            print(f"{start:%Y-%m} is already closed (use --force to rebuild it).")
+        else:
+            _print_month(start, written)
+    elif args.command == "backfill":
+        total = await backfill(parse_month(args.since), on_month=_print_month)
+        print(f"Done: {total} statement rows.")
+    else:
+        start = parse_month(args.month) if args.month else month_start(date.today())
+        _print_month(start, await rebuild_month(start))
+    print(f"Finished in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    close = commands.add_parser("close", help="close a finished month (default: the previous month)")
+    close.add_argument("--month", help="YYYY-MM")
+    close.add_argument("--force", action="store_true", help="rebuild the month even if it is already closed")
+    fill = commands.add_parser("backfill", help="close every month from last month back to --since")
+    fill.add_argument("--since", required=True, help="YYYY-MM")
+    rebuild = commands.add_parser("rebuild", help="recompute a month without closing it (default: the current month)")
+    rebuild.add_argument("--month", help="YYYY-MM")
+    asyncio.run(main(parser.parse_args()))
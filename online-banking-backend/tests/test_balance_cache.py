@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+from sqlalchemy import event, update
+
+import main  # noqa: F401  (creates the tables)
+import balance_cache, database, models
+
+def _read_balance(account_id: int, statements: list):
+    """What GET /accounts/{id}/balance does: the cache, else one primary key read."""
+    async def read():
+        async with database.AsyncSessionLocal() as db:
+            account = balance_cache.get(account_id)
+            if account is None:
+                stamp = balance_cache.write_stamp(account_id)
+                row = await db.get(models.Account, account_id)
+                account = {"account_id": row.account_id, "balance": row.balance, "version": row.version}
+                balance_cache.store(account_id, account, stamp)
+            return account["balance"]
+    statements.clear()
+    return asyncio.run(read())
+
+def test_hits_skip_the_database_and_other_workers_writes_show_after_the_ttl(monkeypatch):
+    monkeypatch.setattr(balance_cache._balances, "ttl", 0.3)
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", listener)
+
+    async def setup():
+        async with database.AsyncSessionLocal() as db:
+            db.add(models.Account(account_id=9001, account_number="9001", account_type="savings", balance=10, version=1))
+            await db.commit()
+
+    async def write_from_another_worker():
+        # This worker's cache never hears of it
+        async with database.AsyncSessionLocal() as db:
+            await db.execute(update(models.Account).where(models.Account.account_id == 9001).values(balance=25, version=2))
+            await db.commit()
+
+    try:
+        asyncio.run(setup())
+        assert _read_balance(9001, statements) == 10 and statements
+        assert _read_balance(9001, statements) == 10 and not statements
+
+        asyncio.run(write_from_another_worker())
+        time.sleep(0.4)
+        assert _read_balance(9001, statements) == 25
+    finally:
+        event.remove(database.async_engine.sync_engine, "before_cursor_execute", listener)
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, select
+
+import models, pagination
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+def _query_plan(engine, stmt) -> str:
+    compiled = stmt.compile(dialect=engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    params = tuple(str(value) if isinstance(value, datetime) else value for value in params)
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return "\n".join(row[-1] for row in rows)
+
+@pytest.mark.parametrize("direction", [None, pagination.NEXT, pagination.PREV])
+def test_history_pages_are_read_in_index_order(engine, direction):
+    cursor = pagination.encode_cursor(direction, datetime(2026, 1, 1), 100) if direction else None
+    stmt, _ = pagination.keyset_page(
+        select(models.Transaction).where(models.Transaction.account_id == 1),
+        models.Transaction.transaction_date,
+        models.Transaction.transaction_id,
+        20,
+        cursor,
+    )
+    plan = _query_plan(engine, stmt)
+    assert "ix_transactions_account_date" in plan
+    assert "USE TEMP B-TREE" not in plan
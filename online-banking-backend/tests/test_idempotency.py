@@ -0,0 +1,74 @@
+import asyncio
+import time
+import warnings
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+import main  # noqa: F401  (creates the tables)
+import database, idempotency, models
+from config import settings
+
+def _row(user_id, key):
+    async def load():
+        async with database.AsyncSessionLocal() as db:
+            return (await db.execute(
+                select(idempotency.keys).where(idempotency._this_key(user_id, key))
+            )).first()
+    return asyncio.run(load())
+
+def test_duplicate_polls_until_the_owner_stores_its_outcome():
+    outcome = {"request_hash": "h", "status_code": 200, "body": {"ok": True}}
+
+    async def scenario():
+        claimed_at, _ = await idempotency._claim(1, "poll", "h")
+        assert claimed_at is not None
+        waiter = asyncio.create_task(idempotency._claim(1, "poll", "h"))
+        await asyncio.sleep(0.3)
+        assert not waiter.done()
+        await idempotency._store(1, "poll", claimed_at, outcome)
+        return await waiter
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")  # Polling must not re-INSERT (SAWarning / IntegrityError churn)
+        assert asyncio.run(scenario()) == (None, outcome)
+
+def test_abandoned_claim_is_taken_over(monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCY_LEASE_SECONDS", 0.5)
+    dead_claim, _ = asyncio.run(idempotency._claim(1, "crashed", "h"))
+
+    time.sleep(1.1)  # The claim goes stale; claim times have whole-second resolution
+    claimed_at, outcome = asyncio.run(idempotency._claim(1, "crashed", "h2"))
+    assert outcome is None and claimed_at > dead_claim
+    assert _row(1, "crashed").request_hash == "h2"
+
+    # The original request finishing late must not overwrite the new owner's row
+    asyncio.run(idempotency._store(1, "crashed", dead_claim, {"status_code": 200, "body": {}}))
+    assert _row(1, "crashed").status_code is None
+
+def test_claim_whose_operation_started_is_never_taken_over(monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCY_LEASE_SECONDS", 0.5)
+    applied = []
+
+    async def transfer():
+        applied.append(1)
+        return {"message": "moved"}
+
+    async def fail_to_store(*args):
+        raise RuntimeError("database went away")
+
+    async def first_attempt():
+        with monkeypatch.context() as patch:
+            patch.setattr(idempotency, "_store", fail_to_store)
+            with pytest.raises(RuntimeError):
+                await idempotency.run(1, "unstored", "transfer", {"amount": 5}, transfer)
+
+    asyncio.run(first_attempt())
+    assert _row(1, "unstored").executing
+
+    time.sleep(1.1)  # Past the lease: a claim that never started would be taken over now
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(idempotency.run(1, "unstored", "transfer", {"amount": 5}, transfer))
+    assert error.value.status_code == 409
+    assert applied == [1]
@@ -0,0 +1,22 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import main  # noqa: F401  (creates the tables)
+import database, schemas
+from config import settings
+from routers import transactions
+
+def test_deposit_into_a_missing_account_is_a_404(monkeypatch):
+    monkeypatch.setattr(settings, "LEDGER_EXECUTION", "direct")
+    request = schemas.DepositWithdrawRequest(account_id=999999, amount=10)
+
+    async def scenario():
+        async with database.AsyncSessionLocal() as db:
+            # The token's account scope lets the ownership check pass without a query
+            await transactions._deposit(db, request, user_id=1, customer_id=1, account_scope=frozenset({999999}))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 404
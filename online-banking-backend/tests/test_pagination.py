@@ -0,0 +1,56 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+import main  # noqa: F401  (creates the tables)
+import database, models, pagination
+
+ACCOUNT_ID = 9101
+
+def _page(db, cursor=None, limit=5):
+    async def fetch():
+        stmt, direction = pagination.keyset_page(
+            select(models.Transaction).where(models.Transaction.account_id == ACCOUNT_ID),
+            models.Transaction.transaction_date,
+            models.Transaction.transaction_id,
+            limit,
+            cursor,
+        )
+        rows = (await db.execute(stmt)).scalars().all()
+        return pagination.page_cursors(rows, limit, direction, cursor is not None)
+    return fetch()
+
+def test_second_page_continues_after_the_first():
+    async def scenario():
+        async with database.AsyncSessionLocal() as db:
+            # Rows dated by the database default (CURRENT_TIMESTAMP) and rows
+            # dated by the application, several sharing one timestamp
+            transactions = models.Transaction.__table__
+            for amount in range(4):
+                await db.execute(insert(transactions).values(account_id=ACCOUNT_ID, transaction_type="deposit", amount=amount))
+            for amount in range(4, 8):
+                db.add(models.Transaction(
+                    account_id=ACCOUNT_ID, transaction_type="deposit", amount=amount,
+                    transaction_date=datetime(2026, 1, 1, 12, 0, 0),
+                ))
+            await db.commit()
+
+            expected = (await db.execute(
+                select(models.Transaction.transaction_id)
+                .where(models.Transaction.account_id == ACCOUNT_ID)
+                .order_by(models.Transaction.transaction_date.desc(), models.Transaction.transaction_id.desc())
+            )).scalars().all()
+
+            # The first page ends inside the database-dated rows
+            first, next_cursor, _ = await _page(db, limit=3)
+            second, _, prev_cursor = await _page(db, next_cursor, limit=3)
+            back, _, _ = await _page(db, prev_cursor, limit=3)
+            return expected, first, second, back
+
+    expected, first, second, back = asyncio.run(scenario())
+    first_ids = [t.transaction_id for t in first]
+    second_ids = [t.transaction_id for t in second]
+    assert first_ids == expected[:3]
+    assert second_ids == expected[3:6]
+    assert [t.transaction_id for t in back] == first_ids
@@ -0,0 +1,28 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+import passwords
+from config import settings
+
+def test_timed_out_hash_stays_in_flight_until_it_finishes(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(passwords, "start", lambda: executor)
+    monkeypatch.setattr(settings, "PASSWORD_TIMEOUT_SECONDS", 0.1)
+
+    async def scenario():
+        with pytest.raises(HTTPException) as error:
+            await passwords._run(time.sleep, 0.5)
+        assert error.value.status_code == 503
+        # The worker is still hashing, so the slot is still taken
+        assert passwords._in_flight == 1
+        await asyncio.sleep(0.6)
+        return passwords._in_flight
+
+    try:
+        assert asyncio.run(scenario()) == 0
+    finally:
+        executor.shutdown()
@@ -0,0 +1,34 @@
+import asyncio
+
+from sqlalchemy import select
+
+import main  # noqa: F401  (creates the tables)
+import bulk_import, database, dependencies, models, passwords
+from config import settings
+
+def _snapshot(user_id: int, username: str) -> dict:
+    return {"user_id": user_id, "customer_id": None, "username": username, "role": "customer", "last_login": None, "created_at": None}
+
+def test_rehash_drops_the_cached_principal(monkeypatch):
+    monkeypatch.setattr(settings, "PASSWORD_POOL_WORKERS", 0)
+    passwords.configure()
+
+    async def scenario():
+        async with database.AsyncSessionLocal() as db:
+            db.add(models.User(user_id=9301, username="rehashed", password_hash="old"))
+            await db.commit()
+        dependencies.principal_cache.set("rehashed", _snapshot(9301, "rehashed"))
+        await passwords.rehash_password(9301, "rehashed", "old", "password1")
+        async with database.AsyncSessionLocal() as db:
+            return await db.scalar(select(models.User.password_hash).where(models.User.user_id == 9301))
+
+    assert asyncio.run(scenario()) != "old"
+    assert dependencies.principal_cache.get("rehashed") is None
+
+def test_import_drops_cached_principals_for_imported_usernames(monkeypatch):
+    monkeypatch.setattr(settings, "PASSWORD_POOL_WORKERS", 0)
+    dependencies.principal_cache.set("imported1", _snapshot(1, "imported1"))
+    row = {"first_name": "Imp", "last_name": "Orted", "email": "imported1@example.com", "username": "imported1", "password": "password123"}
+
+    assert asyncio.run(bulk_import.import_chunk([(1, row)], [])) == 1
+    assert dependencies.principal_cache.get("imported1") is None
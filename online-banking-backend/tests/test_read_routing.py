@@ -0,0 +1,57 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+
+import database, dependencies
+from config import settings
+
+def _read_only(cookie, user_id=1) -> bool:
+    request = SimpleNamespace(cookies={database.WRITE_MARKER_COOKIE: cookie} if cookie else {})
+    user = SimpleNamespace(user_id=user_id)
+
+    async def open_session():
+        sessions = dependencies.get_read_db(request, user)
+        db = await anext(sessions)
+        await sessions.aclose()
+        return db.info["read_only"]
+    return asyncio.run(open_session())
+
+def test_reads_use_the_replica_without_a_write_marker():
+    assert _read_only(None)
+
+def test_recent_write_pins_reads_to_the_primary():
+    assert not _read_only(database._sign_write_marker(1, time.time()))
+
+def test_write_marker_expires():
+    assert _read_only(database._sign_write_marker(1, time.time() - settings.REPLICA_STICKY_SECONDS - 1))
+
+def test_write_marker_is_per_user_and_signed():
+    assert _read_only(database._sign_write_marker(2, time.time()), user_id=1)
+    forged = f"1.{time.time():.3f}.{'0' * 64}"
+    assert _read_only(forged)
+
+def test_middleware_sets_the_marker_only_after_a_write():
+    app = FastAPI()
+    app.add_middleware(database.WriteMarkerMiddleware)
+
+    @app.post("/write")
+    async def write():
+        database.mark_write(7)
+        return {}
+
+    @app.get("/read")
+    async def read():
+        return {}
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            return await client.get("/read"), await client.post("/write")
+    read, written = asyncio.run(scenario())
+
+    assert database.WRITE_MARKER_COOKIE not in read.cookies
+    marker = written.cookies[database.WRITE_MARKER_COOKIE]
+    assert database.recently_wrote(marker, 7)
+    assert not database.recently_wrote(marker, 8)
@@ -0,0 +1,33 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import dependencies
+from config import settings
+
+def _rejected(token):
+    with pytest.raises(HTTPException):
+        dependencies.verify_token(token, HTTPException(status_code=401))
+
+def test_revoked_token_is_rejected_while_cached():
+    token = dependencies.create_access_token({"sub": "alice"})
+    assert dependencies.verify_token(token, HTTPException(status_code=401)).username == "alice"
+
+    dependencies.revoke_token(token)
+    _rejected(token)
+
+def test_revoked_token_stays_rejected_after_token_cache_ttl(monkeypatch):
+    monkeypatch.setattr(settings, "TOKEN_CACHE_TTL_SECONDS", 0.2)
+    token = dependencies.create_access_token({"sub": "bob"})
+    dependencies.verify_token(token, HTTPException(status_code=401))
+
+    dependencies.revoke_token(token)
+    time.sleep(0.3)  # Longer than the token cache keeps anything
+    _rejected(token)
+
+def test_expired_revocations_are_pruned():
+    dependencies.revoke_token(dependencies.create_access_token({"sub": "carol"}))
+    now = time.time() + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60 + 1
+    dependencies._prune_revocations(now)
+    assert all(exp > now for exp in dependencies._revoked_tokens.values())
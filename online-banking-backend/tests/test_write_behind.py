@@ -0,0 +1,31 @@
+import asyncio
+from datetime import datetime
+
+import main  # noqa: F401  (creates the tables)
+import database, models, write_behind
+from config import settings
+
+def test_early_flush_task_is_kept_until_it_finishes(monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_MAX_ENTRIES", 2)
+    logins = {9201: datetime(2026, 1, 1, 8), 9202: datetime(2026, 1, 1, 9)}
+
+    async def scenario():
+        async with database.AsyncSessionLocal() as db:
+            for user_id in logins:
+                db.add(models.User(user_id=user_id, username=f"wb{user_id}", password_hash="x"))
+            await db.commit()
+
+        write_behind.start()
+        try:
+            for user_id, last_login in logins.items():
+                write_behind.record(models.User, user_id, last_login=last_login)
+            assert len(write_behind._tasks) == 1
+            await asyncio.gather(*write_behind._tasks)
+            assert not write_behind._tasks
+        finally:
+            await write_behind.shutdown()
+
+        async with database.AsyncSessionLocal() as db:
+            return {user_id: (await db.get(models.User, user_id)).last_login for user_id in logins}
+
+    assert asyncio.run(scenario()) == logins
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+
+from sqlalchemy import inspect, update
+
+import database, metrics
+from config import settings
+
+# --- Write-Behind Buffer ---
+# Non-critical column updates (e.g. users.last_login) that nobody waits on.
+# Updates to the same row are coalesced in memory (the latest value wins) and
+# written as one bulk UPDATE per model every WRITE_BEHIND_INTERVAL_SECONDS, or
+# as soon as WRITE_BEHIND_MAX_ENTRIES rows are pending. Only use it for values
+# where losing the last few seconds on a crash is acceptable.
+
+_pending = {}  # (model, primary key) -> {column: value}
+_lock = threading.Lock()
+_flush_lock = None  # asyncio.Lock, created by start()
+_flusher = None
+_tasks = set()  # Keeps early flush tasks referenced until they finish
+
+def record(model, primary_key, **values):
+    """Queues an UPDATE of `values` on the `model` row with `primary_key`."""
+    with _lock:
+        _pending.setdefault((model, primary_key), {}).update(values)
+        full = len(_pending) >= settings.WRITE_BEHIND_MAX_ENTRIES
+    metrics.increment("write_behind.recorded")
+    if full and _flusher is not None and not _tasks:
+        # One early flush at a time; it takes everything pending when it runs
+        task = asyncio.get_running_loop().create_task(flush())
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+
+def _take_pending() -> dict:
+    global _pending
+    with _lock:
+        taken, _pending = _pending, {}
+    return taken
+
+def _restore(entries: dict):
+    """Puts back entries from a failed flush, without overwriting newer values."""
+    with _lock:
+        for key, values in entries.items():
+            newer = _pending.get(key, {})
+            _pending[key] = {**values, **newer}
+
+async def flush():
+    """Writes every pending update: one bulk UPDATE per model and column set."""
+    async with _flush_lock or asyncio.Lock():
+        entries = _take_pending()
+        if not entries:
+            return
+
+        # Bulk UPDATE by primary key needs the same columns in every row
+        groups = {}
+        for (model, primary_key), values in entries.items():
+            pk_column = inspect(model).primary_key[0].key
+            groups.setdefault((model, frozenset(values)), []).append({pk_column: primary_key, **values})
+
+        try:
+            async with database.AsyncSessionLocal() as db:
+                for (model, _), rows in groups.items():
+                    await db.execute(update(model), rows)
+                await db.commit()
+        except Exception:
+            metrics.increment("write_behind.flush_failures")
+            _restore(entries)
+            return
+        metrics.increment("write_behind.flushed_rows", len(entries))
+
+async def _flush_periodically():
+    while True:
+        await asyncio.sleep(settings.WRITE_BEHIND_INTERVAL_SECONDS)
+        await flush()
+
+def start():
+    """Starts the periodic flusher. Called from the app lifespan."""
+    global _flusher, _flush_lock
+    _flush_lock = asyncio.Lock()
+    _flusher = asyncio.get_running_loop().create_task(_flush_periodically())
+
+async def shutdown():
+    """Stops the flusher and writes whatever is still pending."""
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        try:
+            await _flusher
+        except asyncio.CancelledError:
+            pass
+        _flusher = None
+    if _tasks:
+        await asyncio.gather(*_tasks, return_exceptions=True)
+    await flush()